@@ -11,10 +11,24 @@ from PIL import Image
 import numpy as np
 import base64
 import io
+import threading
+import time
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
 
+# Optional ONNX Runtime backend
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
+# Inference backend: 'eager', 'torchscript', 'onnx' or 'int8'. All but eager use the
+# files written by scripts/scraping/export-model.py next to best_model.pth
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager')
+
 app = Flask(__name__)
 CORS(app)
 
@@ -34,10 +48,84 @@ CATEGORY_MAPPING = {
     'Not sure': 'top', 'Skip': 'top'
 }
 
+class OnnxModel:
+    """ONNX Runtime session behind the same call interface as the torch model"""
+    def __init__(self, path):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+def load_exported_model(model_path, backend=INFERENCE_BACKEND):
+    """Load the TorchScript, ONNX or INT8 export of model_path if that backend is selected and present.
+
+    An export older than the .pth is of previous weights and is not used.
+    """
+    base = os.path.splitext(model_path)[0]
+    exports = {'torchscript': base + '.torchscript.pt', 'int8': base + '.int8.pt', 'onnx': base + '.onnx'}
+    if backend in exports and os.path.exists(exports[backend]) and \
+            os.path.getmtime(exports[backend]) < os.path.getmtime(model_path):
+        print(f"{exports[backend]} is older than {model_path} (re-run export-model.py); using eager PyTorch")
+        return None
+    scripted = {'torchscript': base + '.torchscript.pt', 'int8': base + '.int8.pt'}
+    if backend in scripted and os.path.exists(scripted[backend]):
+        model = torch.jit.load(scripted[backend], map_location='cpu')
+        model.eval()
+        return model
+    if backend == 'onnx' and ONNXRUNTIME_AVAILABLE and os.path.exists(base + '.onnx'):
+        return OnnxModel(base + '.onnx')
+    if backend != 'eager':
+        print(f"Inference backend '{backend}' not available for {model_path}; using eager PyTorch")
+    return None
+
+def load_state_dict_mmap(model_path):
+    """Weights of model_path, memory-mapped from a pre-converted copy where possible.
+
+    The copy (<name>.weights.pt) holds just the state dict and is rewritten whenever
+    the .pth is newer. Mapping it is near-instant, and every worker process shares
+    one copy of the weights in the page cache.
+    """
+    weights_path = os.path.splitext(model_path)[0] + '.weights.pt'
+    try:
+        if not os.path.exists(weights_path) or os.path.getmtime(weights_path) < os.path.getmtime(model_path):
+            state = torch.load(model_path, map_location='cpu')
+            if isinstance(state, dict) and 'state_dict' in state:
+                state = state['state_dict']
+            temp_path = f"{weights_path}.{os.getpid()}.tmp"
+            torch.save({key: value.contiguous() for key, value in state.items()}, temp_path)
+            os.replace(temp_path, weights_path)
+        return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+    except (OSError, TypeError, RuntimeError) as e:
+        # Read-only model directory, or a torch release without mmap loading
+        print(f"Memory-mapped weights unavailable ({e}); loading {model_path} directly")
+        return torch.load(model_path, map_location='cpu')
+
+def build_resnet(state):
+    """ResNet50 with the FashionRNN head, built on the meta device and given the loaded tensors"""
+    try:
+        with torch.device('meta'):
+            model = models.resnet50(pretrained=False)
+            model.fc = nn.Linear(model.fc.in_features, len(CATEGORY_NAMES))
+        model.load_state_dict(state, assign=True)
+    except (AttributeError, TypeError):
+        # torch < 2.1: no meta-device construction or assign=True
+        model = models.resnet50(pretrained=False)
+        model.fc = nn.Linear(model.fc.in_features, len(CATEGORY_NAMES))
+        model.load_state_dict(state)
+    return model
+
 class FashionRNNClassifier:
     def __init__(self):
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        self.model = self.load_model()
+        self.backend = 'eager'
+        # The model is loaded on first use rather than at import
+        self._model = None
+        self._model_attempted = False
+        self._model_lock = threading.Lock()
         self.transform = transforms.Compose([
             transforms.Resize((224, 224)),
             transforms.ToTensor(),
@@ -46,6 +134,21 @@ class FashionRNNClassifier:
         ])
         print(f"FashionRNN Classifier initialized on {self.device}")
     
+    @property
+    def model(self):
+        if not self._model_attempted:
+            with self._model_lock:
+                if not self._model_attempted:
+                    started = time.perf_counter()
+                    self._model = self.load_model()
+                    self._model_attempted = True
+                    print(f"Model ready in {time.perf_counter() - started:.2f}s ({self.backend} on {self.device})")
+        return self._model
+    
+    def warm_up(self):
+        """Load the model on a background thread so startup does not wait for it"""
+        threading.Thread(target=lambda: self.model, name='model-load', daemon=True).start()
+    
     def load_model(self):
         """Load the FashionRNN model"""
         try:
@@ -66,13 +169,17 @@ class FashionRNNClassifier:
                 print("Model file not found")
                 return None
             
-            # Define the model architecture
-            model = models.resnet50(pretrained=False)
-            num_ftrs = model.fc.in_features
-            model.fc = nn.Linear(num_ftrs, 20)
+            exported = load_exported_model(model_path)
+            if exported is not None:
+                self.backend = INFERENCE_BACKEND
+                # Exported models run on the CPU
+                self.device = torch.device('cpu')
+                print(f"Model loaded successfully from {model_path} ({self.backend})")
+                return exported
             
-            # Load the trained weights
-            model.load_state_dict(torch.load(model_path, map_location=self.device))
+            # Define the model architecture and load the trained weights
+            model = build_resnet(load_state_dict_mmap(model_path))
+            model.to(self.device)
             model.eval()
             print(f"Model loaded successfully from {model_path}")
             return model
@@ -185,6 +292,7 @@ def health_check():
         'status': 'healthy',
         'model_loaded': classifier.model is not None,
         'device': str(classifier.device),
+        'backend': classifier.backend,
         'categories': len(CATEGORY_NAMES)
     })
 
@@ -199,7 +307,8 @@ def get_categories():
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"🚀 Starting FashionRNN API Server on port {port}")
-    print(f"🔧 Model loaded: {classifier.model is not None}")
+    print("🔧 Model loading in the background")
     print(f"🖥️  Device: {classifier.device}")
+    classifier.warm_up()
     
     app.run(host='0.0.0.0', port=port, debug=False)
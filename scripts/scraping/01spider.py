@@ -9,8 +9,12 @@ import logging
 from pathlib import Path
 import time
 import hashlib
+import importlib.util
+import json
+import math
 import re
 import threading
+from collections import defaultdict
 from urllib.parse import urljoin, urlparse, parse_qs, urlunparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -37,6 +41,13 @@ PROJECT_ROOT = SCRIPT_DIR.parent
 URLS_FILE = SCRIPT_DIR / "scrape-urls.txt"
 OUTPUT_DIR = PROJECT_ROOT / "catalog-data"
 IMAGE_LINKS_FILE = OUTPUT_DIR / "image_links.txt"
+SPIDER_STATS_FILE = OUTPUT_DIR / "spider_stats.json"
+# Per-link context (alt text, width/height attributes, page) for the URL scorer
+IMAGE_LINK_META_FILE = OUTPUT_DIR / "image_link_meta.jsonl"
+# Decisions logged by the downloader and the processor, by downloaded file name
+OUTCOME_LOG_FILE = OUTPUT_DIR / "image_outcomes.jsonl"
+# The downloader names files after the MD5 of the cleaned image URL
+DOWNLOADED_FILE_PATTERN = re.compile(r'temp_([0-9a-f]{32})')
 
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
 MIN_IMAGE_SIZE = 100
@@ -48,6 +59,28 @@ MAX_DEPTH = 5
 CRAWL_DELAY = 0.5
 MAX_WORKERS = 39
 
+# Page bandwidth budgets in bytes per second (None = unlimited), enforced with the
+# downloader's token buckets. Selenium loads pages itself, so its pages are charged
+# by rendered size after they load, which delays the next fetch instead
+DOWNLOADER_SCRIPT = SCRIPT_DIR / "02downloader.py"
+GLOBAL_BANDWIDTH_LIMIT = None
+PER_HOST_BANDWIDTH_LIMIT = None
+PAGE_CHUNK_SIZE = 8192
+
+# URL scorer: naive Bayes over URL path tokens, alt text, width/height attributes
+# and domain, trained on the pipeline's past decisions. Links scoring below the
+# threshold that keeps URL_SCORER_RECALL_FLOOR of approved images in its validation
+# split are not saved, except for URL_SCORER_EXPLORE_RATE of them, which go through
+# anyway so that low-scoring kinds of links keep getting outcomes. The model is
+# retrained at startup once URL_SCORER_RETRAIN_EVERY new outcomes have been logged
+URL_SCORER = True
+URL_SCORER_FILE = OUTPUT_DIR / "url_scorer.json"
+URL_SCORER_RECALL_FLOOR = 0.97
+URL_SCORER_RETRAIN_EVERY = 500
+URL_SCORER_MIN_OUTCOMES = 200
+URL_SCORER_MIN_TOKEN_COUNT = 2
+URL_SCORER_EXPLORE_RATE = 0.05
+
 TRACKING_PARAMS = {
     'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
     'fbclid', 'gclid', 'msclkid', 'ref', 'referrer', 'source', 'campaign',
@@ -61,8 +94,161 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _read_jsonl(path):
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted write
+
+def _dimension_bucket(value):
+    try:
+        value = int(str(value).strip().lower().rstrip('px'))
+    except (TypeError, ValueError):
+        return 'none'
+    for limit, name in ((64, 'icon'), (150, 'small'), (400, 'medium')):
+        if value < limit:
+            return name
+    return 'large'
+
+def link_tokens(meta):
+    """Features of one image link: domain, URL path and query tokens, alt words, attribute sizes, page path"""
+    parsed = urlparse(meta['url'])
+    path = parsed.path.lower()
+    tokens = {'host:' + parsed.netloc.lower().removeprefix('www.')}
+    tokens.update('path:' + word for word in re.findall(r'[a-z]{2,}', path))
+    if re.search(r'\d+x\d+', path):
+        tokens.add('path:<size>')
+    tokens.add('ext:' + (os.path.splitext(path)[1] or 'none'))
+    tokens.update('query:' + key.lower() for key in parse_qs(parsed.query))
+    alt_words = re.findall(r'[a-z]{2,}', (meta.get('alt') or '').lower())
+    tokens.update('alt:' + word for word in alt_words)
+    if not alt_words:
+        tokens.add('alt:<none>')
+    tokens.add('width:' + _dimension_bucket(meta.get('width')))
+    tokens.add('height:' + _dimension_bucket(meta.get('height')))
+    tokens.update('page:' + word for word in re.findall(r'[a-z]{2,}', urlparse(meta.get('page', '')).path.lower()))
+    return tokens
+
+def load_labelled_links(meta_file=IMAGE_LINK_META_FILE, outcome_file=OUTCOME_LOG_FILE):
+    """(link metadata, approved) for every recorded link whose download has an outcome"""
+    approved = {}
+    for record in _read_jsonl(outcome_file):
+        match = DOWNLOADED_FILE_PATTERN.match(record.get('file', ''))
+        if match:
+            approved[match.group(1)] = record.get('decision') == 'approved'
+    labelled = {}
+    for meta in _read_jsonl(meta_file):
+        url_hash = hashlib.md5(WebSpider._clean_url(meta['url']).encode()).hexdigest()
+        if url_hash in approved:
+            labelled[url_hash] = (meta, approved[url_hash])
+    return list(labelled.values())
+
+class UrlScorer:
+    """Log-odds of a link's image being approved, from the tokens of link_tokens.
+
+    The model file keeps the validation scores of approved and rejected links, so
+    the threshold for any recall floor is derived at load time without retraining.
+    """
+
+    def __init__(self, model, recall_floor=URL_SCORER_RECALL_FLOOR):
+        self.weights = model['weights']
+        self.bias = model['bias']
+        self.outcomes = model['outcomes']
+        positive, negative = model['positive_scores'], model['negative_scores']
+        # Highest threshold that keeps recall_floor of the approved validation links
+        self.threshold = positive[min(len(positive) - 1, int((1.0 - recall_floor) * len(positive)))]
+        self.expected_recall = sum(score >= self.threshold for score in positive) / len(positive)
+        self.expected_drop = sum(score < self.threshold for score in negative) / max(len(negative), 1)
+
+    def score(self, meta):
+        return self.bias + sum(self.weights.get(token, 0.0) for token in link_tokens(meta))
+
+    def keep(self, meta, score=None):
+        """False for links to drop; a deterministic URL_SCORER_EXPLORE_RATE sample of them is kept"""
+        if (self.score(meta) if score is None else score) >= self.threshold:
+            return True
+        sample = int(hashlib.md5(meta['url'].encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return sample < URL_SCORER_EXPLORE_RATE
+
+    @staticmethod
+    def train(labelled, min_outcomes=URL_SCORER_MIN_OUTCOMES, min_per_class=20):
+        """Fit the token log-odds on three quarters of the labelled links and score the rest"""
+        if len(labelled) < min_outcomes:
+            raise ValueError(f"{len(labelled)} labelled links, need {min_outcomes}")
+        train, validation = [], []
+        for meta, approved in labelled:
+            split = validation if int(hashlib.md5(meta['url'].encode()).hexdigest()[:8], 16) % 4 == 0 else train
+            split.append((link_tokens(meta), approved))
+        for label in (True, False):
+            count = sum(approved == label for _, approved in validation)
+            if count < min_per_class:
+                raise ValueError(f"{count} {'approved' if label else 'rejected'} links in the validation "
+                                 f"split, need {min_per_class}")
+        
+        counts = {True: defaultdict(int), False: defaultdict(int)}
+        totals = {True: 0, False: 0}
+        for tokens, approved in train:
+            totals[approved] += 1
+            for token in tokens:
+                counts[approved][token] += 1
+        vocabulary = [token for token in set(counts[True]) | set(counts[False])
+                      if counts[True][token] + counts[False][token] >= URL_SCORER_MIN_TOKEN_COUNT]
+        # Laplace-smoothed per-link token frequencies
+        weights = {token: math.log((counts[True][token] + 1) / (totals[True] + 2)) -
+                          math.log((counts[False][token] + 1) / (totals[False] + 2))
+                   for token in vocabulary}
+        bias = math.log((totals[True] + 1) / (totals[False] + 1))
+        
+        def score(tokens):
+            return bias + sum(weights.get(token, 0.0) for token in tokens)
+        return {
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'outcomes': len(labelled),
+            'bias': bias,
+            'weights': weights,
+            'positive_scores': sorted(score(tokens) for tokens, approved in validation if approved),
+            'negative_scores': sorted(score(tokens) for tokens, approved in validation if not approved),
+        }
+
+def load_url_scorer(recall_floor=URL_SCORER_RECALL_FLOOR, model_file=URL_SCORER_FILE):
+    """The URL scorer, retrained first when enough new outcomes have been logged; None without one"""
+    model = None
+    if model_file.exists():
+        with open(model_file, 'r', encoding='utf-8') as f:
+            model = json.load(f)
+    labelled = load_labelled_links()
+    if model is None or len(labelled) - model['outcomes'] >= URL_SCORER_RETRAIN_EVERY:
+        try:
+            model = UrlScorer.train(labelled)
+        except ValueError as e:
+            logger.info("URL scorer not trained: %s", e)
+        else:
+            model_file.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = model_file.with_suffix('.tmp')
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(model, f)
+            os.replace(temp_file, model_file)
+            logger.info("URL scorer trained on %d links (%d tokens)", model['outcomes'], len(model['weights']))
+    if model is None:
+        return None
+    scorer = UrlScorer(model, recall_floor)
+    logger.info("URL scorer: keeps %.1f%% of approved and drops %.1f%% of rejected validation links",
+                scorer.expected_recall * 100, scorer.expected_drop * 100)
+    return scorer
+
+def load_downloader_module():
+    """Import 02downloader.py, which cannot be imported by name because of its numeric prefix"""
+    spec = importlib.util.spec_from_file_location("downloader", DOWNLOADER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 class WebSpider:
-    def __init__(self):
+    def __init__(self, scorer=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': USER_AGENT,
@@ -75,6 +261,13 @@ class WebSpider:
         self.driver = None
         self.lock = threading.Lock()
         self.output_file = IMAGE_LINKS_FILE
+        self.meta_file = IMAGE_LINK_META_FILE
+        self.scorer = scorer
+        self.host_stats = defaultdict(lambda: {'pages': 0, 'page_bytes': 0, 'image_links': 0, 'dropped_links': 0})
+        self.fetch_seconds = 0.0
+        self.bandwidth = None
+        if GLOBAL_BANDWIDTH_LIMIT or PER_HOST_BANDWIDTH_LIMIT:
+            self.bandwidth = load_downloader_module().BandwidthLimiter(GLOBAL_BANDWIDTH_LIMIT, PER_HOST_BANDWIDTH_LIMIT)
 
     def _init_selenium(self):
         if self.driver is not None or not SELENIUM_AVAILABLE:
@@ -144,7 +337,7 @@ class WebSpider:
         except Exception:
             return False
 
-    def _save_image_links_immediately(self, image_urls):
+    def _save_image_links_immediately(self, image_urls, link_meta=()):
         """Save image URLs to file immediately as they are found"""
         if not image_urls:
             return
@@ -153,6 +346,10 @@ class WebSpider:
         with open(self.output_file, 'a', encoding='utf-8') as f:
             for url in image_urls:
                 f.write(f"{url}\n")
+        if link_meta:
+            with open(self.meta_file, 'a', encoding='utf-8') as f:
+                for meta in link_meta:
+                    f.write(json.dumps(meta) + "\n")
         logger.debug("Immediately saved %d new image links", len(image_urls))
 
     def crawl(self, start_url, max_images=200):
@@ -195,6 +392,17 @@ class WebSpider:
         return list(self.image_urls)
 
     def _fetch_page(self, url):
+        started = time.monotonic()
+        html_content = self._fetch_page_content(url)
+        self.fetch_seconds += time.monotonic() - started
+        if html_content is not None:
+            stats = self.host_stats[urlparse(url).netloc]
+            stats['pages'] += 1
+            # Rendered DOM size for Selenium, decoded body size for requests
+            stats['page_bytes'] += len(html_content.encode('utf-8', errors='ignore'))
+        return html_content
+
+    def _fetch_page_content(self, url):
         if SELENIUM_AVAILABLE:
             try:
                 if self.driver is None:
@@ -206,13 +414,27 @@ class WebSpider:
                     except Exception:
                         pass
                     time.sleep(1.5)
-                    return self.driver.page_source
+                    html_content = self.driver.page_source
+                    if self.bandwidth is not None:
+                        self.bandwidth.throttle(urlparse(url).netloc, len(html_content.encode('utf-8', errors='ignore')))
+                    return html_content
             except Exception:
                 logger.warning("Selenium fetch failed for %s. Falling back to requests.", url)
                 
         try:
-            resp = self.session.get(url, timeout=15)
+            if self.bandwidth is None:
+                resp = self.session.get(url, timeout=15)
+                resp.raise_for_status()
+                return resp.text
+            host = urlparse(url).netloc
+            resp = self.session.get(url, timeout=15, stream=True)
             resp.raise_for_status()
+            chunks = []
+            for chunk in resp.iter_content(chunk_size=PAGE_CHUNK_SIZE):
+                self.bandwidth.throttle(host, len(chunk))
+                chunks.append(chunk)
+            # Hand the body back to requests so .text picks the encoding as usual
+            resp._content = b''.join(chunks)
             return resp.text
         except Exception:
             logger.error("Requests fetch failed for %s", url)
@@ -221,7 +443,8 @@ class WebSpider:
     def _extract_images(self, soup, page_url):
         images_found = 0
         img_tags = soup.find_all('img')
-        new_urls = []
+        new_links = []
+        dropped = 0
         
         for img in img_tags:
             img_url = (img.get('src') or img.get('data-src') or img.get('data-lazy-src'))
@@ -233,12 +456,26 @@ class WebSpider:
             
             if self._is_valid_image_url(cleaned_url) and cleaned_url not in self.image_urls:
                 self.image_urls.add(cleaned_url)
-                new_urls.append(cleaned_url)
+                meta = {'url': cleaned_url, 'page': page_url, 'alt': img.get('alt', ''),
+                        'width': img.get('width'), 'height': img.get('height')}
+                score = self.scorer.score(meta) if self.scorer is not None else 0.0
+                if self.scorer is not None and not self.scorer.keep(meta, score):
+                    dropped += 1
+                    continue
+                new_links.append((score, meta))
                 images_found += 1
         
-        # Save new URLs immediately as they are found
-        if new_urls:
-            self._save_image_links_immediately(new_urls)
+        stats = self.host_stats[urlparse(page_url).netloc]
+        stats['image_links'] += len(new_links)
+        stats['dropped_links'] += dropped
+        if dropped:
+            logger.info("URL scorer dropped %d image links", dropped)
+        
+        # Save new URLs immediately as they are found, most promising first
+        if new_links:
+            new_links.sort(key=lambda link: link[0], reverse=True)
+            self._save_image_links_immediately([meta['url'] for _, meta in new_links],
+                                               [meta for _, meta in new_links])
                 
         return images_found
 
@@ -274,6 +511,23 @@ class WebSpider:
         except Exception:
             return False
 
+    def save_stats(self, stats_file=SPIDER_STATS_FILE):
+        """Write per-host page byte accounting as JSON"""
+        page_bytes = sum(stats['page_bytes'] for stats in self.host_stats.values())
+        throughput = page_bytes / (1024 * 1024) / self.fetch_seconds if self.fetch_seconds > 0 else 0.0
+        report = {
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'fetch_seconds': round(self.fetch_seconds, 3),
+            'page_bytes': page_bytes,
+            'throughput_mb_per_sec': round(throughput, 3),
+            'hosts': dict(sorted(self.host_stats.items(), key=lambda item: item[1]['page_bytes'], reverse=True)),
+        }
+        stats_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info("Page bytes: %.1f MB | Throughput: %.2f MB/s", page_bytes / (1024 * 1024), throughput)
+        logger.info("Spider stats written to %s", stats_file)
+
 def save_image_links(image_urls, output_file):
     """Save image URLs to file for downloader (backup function)"""
     output_file.parent.mkdir(parents=True, exist_ok=True)
@@ -304,7 +558,8 @@ def main():
         logger.error("No URLs found in %s", URLS_FILE)
         return
         
-    spider = WebSpider()
+    scorer = load_url_scorer() if URL_SCORER else None
+    spider = WebSpider(scorer=scorer)
     all_image_urls = []
     
     for i, url in enumerate(urls):
@@ -316,6 +571,7 @@ def main():
     # Remove duplicates and save final consolidated list
     all_image_urls = list(set(all_image_urls))
     logger.info("Total unique image URLs found: %d", len(all_image_urls))
+    spider.save_stats()
     
     # Optional: Save final deduplicated list (commented out since we're saving in real-time)
     # save_image_links(all_image_urls, IMAGE_LINKS_FILE)
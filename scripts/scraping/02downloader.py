@@ -8,21 +8,44 @@ import sys
 import logging
 from pathlib import Path
 import time
+import bisect
 import hashlib
+import heapq
+import importlib.util
+import json
+import mmap
+import random
+import shutil
+import subprocess
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urlparse, parse_qs, urlunparse
+from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from queue import Full, Queue
+from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 import requests
 from PIL import Image
 
+# fcntl is POSIX-only; without it the hash store is only locked within a process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 OUTPUT_DIR = PROJECT_ROOT / "catalog-data"
 IMAGE_LINKS_FILE = OUTPUT_DIR / "image_links.txt"
 TMP_DOWNLOAD_DIR = OUTPUT_DIR / "tmp_images"
-DOWNLOADED_HASHES_FILE = OUTPUT_DIR / ".downloaded_hashes.txt"
+DOWNLOAD_STATS_FILE = OUTPUT_DIR / "download_stats.json"
+# Shared with the processor; feeds the spider's URL scorer
+OUTCOME_LOG_FILE = OUTPUT_DIR / "image_outcomes.jsonl"
+PROCESSOR_SCRIPT = SCRIPT_DIR / "03processor.py"
+DOWNLOADED_HASHES_FILE = OUTPUT_DIR / ".downloaded_hashes.bin"
+DOWNLOADED_HASHES_LOG = OUTPUT_DIR / ".downloaded_hashes.log"
+LEGACY_DOWNLOADED_HASHES_FILE = OUTPUT_DIR / ".downloaded_hashes.txt"
 
 MIN_IMAGE_SIZE = 100
 MAX_IMAGE_SIZE = 2000
@@ -30,6 +53,60 @@ USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 MAX_WORKERS = 2
 MAX_RETRIES = 3
 
+# Bandwidth budgets in bytes per second (None = unlimited), enforced with token
+# buckets that allow bursts of up to one second's worth of traffic
+GLOBAL_BANDWIDTH_LIMIT = None
+PER_HOST_BANDWIDTH_LIMIT = None
+DOWNLOAD_CHUNK_SIZE = 8192
+
+# Streaming mode: hand each finished download to an in-process ImageProcessor
+# through a bounded queue instead of leaving it in tmp_images for a later run
+STREAM_TO_PROCESSOR = False
+STREAM_QUEUE_SIZE = 32
+# How often a blocked download worker checks that the processor thread is still alive
+STREAM_POLL_SECONDS = 1.0
+
+# Thumbnail-first downloads (streaming mode only): for CDNs that resize on request,
+# a THUMBNAIL_SIZE preview is fetched and run through every rejection stage, and
+# the full-resolution file is only downloaded for approved images (the processor
+# runs its resolution-sensitive stages again on that file)
+THUMBNAIL_FIRST = True
+THUMBNAIL_SIZE = 256
+# Resize query parameters per CDN host (suffix match); {size} is THUMBNAIL_SIZE.
+# Cloudinary takes its transformation in the path and is handled separately
+THUMBNAIL_QUERY_PARAMS = {
+    'cdn.shopify.com': {'width': '{size}'},
+    'imgix.net': {'w': '{size}', 'h': '{size}', 'fit': 'max'},
+    'images.ctfassets.net': {'w': '{size}'},
+    'scene7.com': {'wid': '{size}'},
+    'i0.wp.com': {'w': '{size}'},
+    'i1.wp.com': {'w': '{size}'},
+    'i2.wp.com': {'w': '{size}'},
+}
+CLOUDINARY_UPLOAD_SEGMENT = '/image/upload/'
+
+# Keep the original bytes when an image already meets the pipeline's requirements
+# (RGB JPEG within MAX_IMAGE_SIZE) instead of decoding and re-encoding it
+PASS_THROUGH_CONFORMANT = True
+# jpegtran is used for lossless transcodes when available (e.g. stripping an EXIF
+# orientation tag so the stored pixels match what a re-encode would have produced)
+JPEGTRAN_PATH = shutil.which('jpegtran')
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Retry policy: only transient failures are retried, with exponential backoff and
+# full jitter; hosts that keep failing are short-circuited and their URLs parked
+RETRYABLE_HTTP_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 60.0
+RETRY_PASS_MAX_WAIT = 60.0
+
+# Downloaded hash store: appends are batched, and the log is folded into the
+# sorted base file once it reaches the compaction threshold
+HASH_STORE_FLUSH_EVERY = 64
+HASH_STORE_COMPACT_THRESHOLD = 4096
+
 TRACKING_PARAMS = {
     'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
     'fbclid', 'gclid', 'msclkid', 'ref', 'referrer', 'source', 'campaign',
@@ -43,8 +120,398 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class _SortedDigestFile:
+    """Read-only, memory-mapped view of a file of sorted fixed-size digests"""
+
+    def __init__(self, path, record_size):
+        self.record_size = record_size
+        self._file = None
+        self._map = None
+        self._count = 0
+        if path.exists() and path.stat().st_size >= record_size:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._count = len(self._map) // record_size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        offset = index * self.record_size
+        return self._map[offset:offset + self.record_size]
+
+    def __contains__(self, digest):
+        index = bisect.bisect_left(self, digest)
+        return index < self._count and self[index] == digest
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._map = None
+        self._file = None
+        self._count = 0
+
+
+class DownloadedHashStore:
+    """Set of URL digests backed by a sorted binary file plus an append log.
+
+    The base file holds raw 16-byte MD5 digests in sorted order and is searched
+    through mmap, so loading it costs nothing however large the archive grows.
+    New digests are kept in memory, appended to the log in batches and merged
+    into the base file once the log passes HASH_STORE_COMPACT_THRESHOLD entries.
+    The downloader and scrape-catalog.py share the files, so appends and
+    compaction also hold an flock on a sibling .lock file.
+    """
+
+    RECORD_SIZE = 16
+
+    def __init__(self, base_path, log_path, legacy_path=None):
+        self.base_path = Path(base_path)
+        self.log_path = Path(log_path)
+        self.lock_path = self.base_path.with_suffix('.lock')
+        self.lock = threading.Lock()
+        self.recent = set()
+        self.pending = []
+        self.log_count = 0
+
+        with self._process_lock():
+            if legacy_path is not None:
+                self._migrate_legacy(Path(legacy_path))
+            self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+            self._load_log()
+
+    @contextmanager
+    def _process_lock(self):
+        """Exclusive across processes using the same store (a no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _migrate_legacy(self, legacy_path):
+        """Import the old one-hex-digest-per-line text file on first use"""
+        if self.base_path.exists() or self.log_path.exists() or not legacy_path.exists():
+            return
+        digests = set()
+        try:
+            with open(legacy_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) == self.RECORD_SIZE * 2:
+                        digests.add(bytes.fromhex(line))
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to migrate downloaded hashes file: %s", e)
+            return
+        self._write_base(sorted(digests))
+        logger.info("Migrated %d downloaded hashes from %s", len(digests), legacy_path.name)
+
+    def _load_log(self):
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % self.RECORD_SIZE
+        for offset in range(0, usable, self.RECORD_SIZE):
+            self.recent.add(data[offset:offset + self.RECORD_SIZE])
+        self.log_count = usable // self.RECORD_SIZE
+
+    def _write_base(self, digests):
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.base_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(digests))
+        os.replace(str(tmp_path), str(self.base_path))
+
+    def __contains__(self, image_hash):
+        digest = bytes.fromhex(image_hash)
+        with self.lock:
+            return digest in self.recent or digest in self.base
+
+    def __len__(self):
+        with self.lock:
+            return len(self.base) + len(self.recent)
+
+    def add(self, image_hash):
+        digest = bytes.fromhex(image_hash)
+        with self.lock:
+            if digest in self.recent or digest in self.base:
+                return
+            self.recent.add(digest)
+            self.pending.append(digest)
+            if len(self.pending) >= HASH_STORE_FLUSH_EVERY:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._process_lock():
+            with open(self.log_path, 'ab') as f:
+                f.write(b''.join(self.pending))
+            self.pending = []
+            # Other processes append to the same log
+            self.log_count = self.log_path.stat().st_size // self.RECORD_SIZE
+            if self.log_count >= HASH_STORE_COMPACT_THRESHOLD:
+                self._compact_locked()
+
+    def _compact_locked(self):
+        """Merge the append log into the sorted base file; called with the process lock held.
+
+        The base file and the log are re-read first, since another process may have
+        compacted or appended since this one loaded them.
+        """
+        self.base.close()
+        self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+        self._load_log()
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.base_path.with_suffix('.tmp')
+        count = 0
+        previous = None
+        with open(tmp_path, 'wb') as f:
+            for digest in heapq.merge(self.base, sorted(self.recent)):
+                if digest != previous:
+                    f.write(digest)
+                    count += 1
+                    previous = digest
+        # The map must be released before the file is replaced (Windows)
+        self.base.close()
+        os.replace(str(tmp_path), str(self.base_path))
+        self._safe_unlink(self.log_path)
+        self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+        self.recent = set()
+        self.log_count = 0
+        logger.debug("Compacted downloaded hashes store: %d entries", count)
+
+    @staticmethod
+    def _safe_unlink(path):
+        try:
+            os.remove(str(path))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self.lock:
+            self._flush_locked()
+            self.base.close()
+
+class HostCircuitBreaker:
+    """Per-host circuit breaker.
+
+    Opens after CIRCUIT_FAILURE_THRESHOLD consecutive transient failures and
+    rejects requests until CIRCUIT_RESET_TIMEOUT has passed. A single trial
+    request is then let through: success closes the circuit, failure re-opens it.
+    Requests made with wait=True during the trial block until it settles and then
+    follow its outcome instead of being refused.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.trial_settled = threading.Condition(self.lock)
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def allow_request(self, wait=False):
+        with self.lock:
+            # A trial that has not settled after a whole reset period parks the request
+            deadline = time.monotonic() + self.reset_timeout
+            while True:
+                if self.opened_at is None:
+                    return True
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                if not self.trial_in_flight:
+                    self.trial_in_flight = True
+                    return True
+                remaining = deadline - time.monotonic()
+                if not wait or remaining <= 0:
+                    return False
+                self.trial_settled.wait(remaining)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+            self.trial_settled.notify_all()
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+            self.trial_settled.notify_all()
+
+    def release_trial(self):
+        """End a request that says nothing about the host's health (e.g. a malformed
+        URL); if it was the half-open trial, the next request becomes the trial"""
+        with self.lock:
+            self.trial_in_flight = False
+            self.trial_settled.notify_all()
+
+    def seconds_until_retry(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+class TokenBucket:
+    """Thread-safe token bucket; consume() blocks until enough bytes are available"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going into debt lets chunks larger than the burst size through while
+            # still delaying the caller for exactly the time those bytes cost
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+class BandwidthLimiter:
+    """Global plus per-host byte budgets"""
+
+    def __init__(self, global_rate=GLOBAL_BANDWIDTH_LIMIT, per_host_rate=PER_HOST_BANDWIDTH_LIMIT):
+        self.global_bucket = TokenBucket(global_rate) if global_rate else None
+        self.per_host_rate = per_host_rate
+        self.host_buckets = {}
+        self.lock = threading.Lock()
+
+    def throttle(self, host, amount):
+        if self.per_host_rate:
+            with self.lock:
+                bucket = self.host_buckets.get(host)
+                if bucket is None:
+                    bucket = self.host_buckets[host] = TokenBucket(self.per_host_rate)
+            bucket.consume(amount)
+        if self.global_bucket is not None:
+            self.global_bucket.consume(amount)
+
+def thumbnail_url(url, size=THUMBNAIL_SIZE):
+    """URL of a CDN-resized variant of url about size px wide, or None for hosts that cannot resize"""
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None
+    host = parsed.netloc.lower().split(':')[0]
+    if host.endswith('cloudinary.com') and CLOUDINARY_UPLOAD_SEGMENT in parsed.path:
+        transform = f"{CLOUDINARY_UPLOAD_SEGMENT}w_{size},h_{size},c_limit/"
+        return urlunparse(parsed._replace(path=parsed.path.replace(CLOUDINARY_UPLOAD_SEGMENT, transform, 1)))
+    for suffix, params in THUMBNAIL_QUERY_PARAMS.items():
+        if host == suffix or host.endswith('.' + suffix):
+            # Other parameters are kept verbatim (e.g. Scene7 presets like $pdp$)
+            kept = [part for part in parsed.query.split('&') if part and part.split('=', 1)[0] not in params]
+            resize = urlencode({key: value.format(size=size) for key, value in params.items()})
+            return urlunparse(parsed._replace(query='&'.join(kept + [resize])))
+    return None
+
+def load_processor_module():
+    """Import 03processor.py, which cannot be imported by name because of its numeric prefix"""
+    spec = importlib.util.spec_from_file_location("processor", PROCESSOR_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class ProcessorStream:
+    """Feeds finished downloads to an ImageProcessor running on a consumer thread.
+
+    The queue is bounded, so download workers block once the processor falls
+    STREAM_QUEUE_SIZE images behind instead of filling the disk.
+    """
+    PREVIEW_FAILED = object()  # evaluate() result when the processor could not evaluate a preview
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        processor_module = load_processor_module()
+        if not processor_module.MODEL_PATH.exists():
+            raise FileNotFoundError(f"Model not found at {processor_module.MODEL_PATH}")
+        self.queue = Queue(maxsize=queue_size)
+        self.processor = processor_module.ImageProcessor()
+        self.thread = threading.Thread(
+            target=self.processor.process_stream, args=(self.queue,), name='processor-stream', daemon=True
+        )
+        self.thread.start()
+
+    def _check_alive(self):
+        if not self.thread.is_alive():
+            raise RuntimeError("Processor stream has stopped; see the processor's error above")
+
+    def _put(self, item):
+        """Queue an item, raising instead of blocking forever if the processor has died"""
+        while True:
+            self._check_alive()
+            try:
+                self.queue.put(item, timeout=STREAM_POLL_SECONDS)
+                return
+            except Full:
+                continue
+
+    def put(self, image_path):
+        self._put((image_path, time.monotonic()))
+
+    def evaluate(self, preview_path):
+        """Run the processor's stages on a preview and wait for the decision.
+
+        Returns the result to commit with the full-resolution file, None when
+        the processor is done with the image (rejected or already cataloged), or
+        PREVIEW_FAILED when the preview could not be evaluated.
+        """
+        decision = Future()
+        self._put((preview_path, time.monotonic(), decision))
+        while True:
+            try:
+                return decision.result(timeout=STREAM_POLL_SECONDS)
+            except FutureTimeout:
+                self._check_alive()
+            except Exception as e:
+                logger.warning("Could not evaluate preview %s: %s", Path(preview_path).name, e)
+                return self.PREVIEW_FAILED
+
+    def commit(self, image_path, result):
+        """Hand over the full-resolution file of an image approved on its preview"""
+        self._put((image_path, time.monotonic(), result))
+
+    def close(self):
+        """Signal the end of the stream and wait for the processor to drain it"""
+        if not self.thread.is_alive():
+            logger.error("Processor stream stopped before the end of the downloads")
+            return
+        try:
+            self._put(None)
+        except RuntimeError:
+            logger.error("Processor stream stopped before the end of the downloads")
+            return
+        while self.thread.is_alive():
+            self.thread.join(timeout=STREAM_POLL_SECONDS)
+
 class ImageDownloader:
-    def __init__(self):
+    def __init__(self, stream=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': USER_AGENT,
@@ -54,27 +521,34 @@ class ImageDownloader:
         })
         self.downloaded_hashes = self._load_downloaded_hashes()
         self.lock = threading.Lock()
+        self.stream = stream
+        self.bandwidth = BandwidthLimiter()
+        self.host_stats = defaultdict(lambda: {'images': 0, 'image_bytes': 0, 'discarded_image_bytes': 0,
+                                               'preview_bytes': 0})
+        self.transfer_seconds = 0.0
+        self.circuit_breakers = {}
+        self.retrying_parked = False
+        self.parked_urls = set()
         self.stats = {
             'total_urls': 0,
             'successful_downloads': 0,
             'failed_downloads': 0,
-            'skipped_duplicates': 0
+            'skipped_duplicates': 0,
+            'permanent_failures': 0,
+            'parked_urls': 0,
+            'recovered_on_retry': 0,
+            'image_bytes': 0,
+            'discarded_image_bytes': 0,
+            'passed_through': 0,
+            'lossless_transcoded': 0,
+            're_encoded': 0,
+            'previews': 0,
+            'rejected_on_preview': 0,
+            'preview_bytes': 0
         }
 
     def _load_downloaded_hashes(self):
-        hashes = set()
-        try:
-            if DOWNLOADED_HASHES_FILE.exists():
-                with open(DOWNLOADED_HASHES_FILE, 'r') as f:
-                    hashes = set(line.strip() for line in f if line.strip())
-        except Exception:
-            logger.warning("Failed to read downloaded hashes file")
-        return hashes
-
-    def _save_downloaded_hash(self, image_hash):
-        DOWNLOADED_HASHES_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(DOWNLOADED_HASHES_FILE, 'a') as f:
-            f.write(f"{image_hash}\n")
+        return DownloadedHashStore(DOWNLOADED_HASHES_FILE, DOWNLOADED_HASHES_LOG, LEGACY_DOWNLOADED_HASHES_FILE)
 
     def _remove_url_from_file(self, image_url):
         """Remove a URL from the image_links.txt file"""
@@ -151,22 +625,213 @@ class ImageDownloader:
                 logger.warning("Error deleting file %s: %s", file_path, e)
                 break
 
+    STORE_MODE_STATS = {
+        'pass_through': 'passed_through',
+        'lossless_transcode': 'lossless_transcoded',
+        're_encode': 're_encoded',
+    }
+
+    @staticmethod
+    def _choose_store_mode(img):
+        """Decide how a verified image is written: keep bytes, lossless transcode or re-encode"""
+        if not PASS_THROUGH_CONFORMANT:
+            return 're_encode'
+        width, height = img.size
+        if img.format != 'JPEG' or img.mode != 'RGB' or width > MAX_IMAGE_SIZE or height > MAX_IMAGE_SIZE:
+            return 're_encode'
+        
+        # A re-encode drops EXIF, so rotated images must lose their orientation tag too
+        # or OpenCV would auto-rotate them in the processor
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        if orientation not in (0, 1) and not JPEGTRAN_PATH:
+            return 're_encode'
+        
+        # verify() does not decode JPEG scan data, so make sure the whole stream
+        # decodes; a 1/8-scale DCT decode is enough and costs a fraction of a full one
+        img.draft('RGB', (max(1, width // 8), max(1, height // 8)))
+        img.load()
+        return 'pass_through' if orientation in (0, 1) else 'lossless_transcode'
+
+    @staticmethod
+    def _lossless_transcode(source_path, output_path):
+        """Rewrite a JPEG without metadata using jpegtran (no DCT requantisation)"""
+        try:
+            subprocess.run(
+                [JPEGTRAN_PATH, '-copy', 'none', '-optimize', '-outfile', str(output_path), str(source_path)],
+                check=True, capture_output=True, timeout=30
+            )
+            return True
+        except Exception as e:
+            logger.warning("Lossless transcode failed, re-encoding instead: %s", e)
+            return False
+
+    def _get_circuit_breaker(self, host):
+        with self.lock:
+            breaker = self.circuit_breakers.get(host)
+            if breaker is None:
+                breaker = self.circuit_breakers[host] = HostCircuitBreaker()
+            return breaker
+
+    @staticmethod
+    def _is_retryable(error):
+        """Transient network and server errors are retried; 4xx responses are not"""
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return status in RETRYABLE_HTTP_STATUSES
+        return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                                  requests.exceptions.ChunkedEncodingError))
+
+    @staticmethod
+    def _is_permanent(error):
+        """Failures that say the link itself is bad: a 4xx answer or a malformed URL"""
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return status is not None and 400 <= status < 500
+        return isinstance(error, (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                                  requests.exceptions.InvalidSchema))
+
+    @staticmethod
+    def _is_local_io_error(error):
+        """Errors writing or moving files here (disk full, permissions), not about the image.
+
+        Pillow's decode errors are OSErrors too, but without an errno.
+        """
+        return (isinstance(error, OSError) and error.errno is not None
+                and not isinstance(error, requests.RequestException))
+
+    @staticmethod
+    def _is_truncated(error):
+        """Pillow's errors for image data that stops early (e.g. "image file is truncated")"""
+        return isinstance(error, (OSError, SyntaxError)) and 'truncated' in str(error).lower()
+
+    @staticmethod
+    def _backoff_delay(attempt, error):
+        """Exponential backoff with full jitter, honouring Retry-After when present"""
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(RETRY_MAX_DELAY, float(retry_after))
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+    def _account_bytes(self, host, nbytes, kept):
+        """Attribute transferred bytes to kept images or to downloads discarded here.
+
+        Discarded means failed or truncated transfers and invalid or too-small images;
+        images the processor rejects later were kept by the downloader and count as kept.
+        """
+        key = 'image_bytes' if kept else 'discarded_image_bytes'
+        with self.lock:
+            self.stats[key] += nbytes
+            self.host_stats[host][key] += nbytes
+            if kept:
+                self.host_stats[host]['images'] += 1
+
+    def _fetch_preview(self, preview_url, output_path):
+        """Single-attempt download of a CDN-resized preview; False means fall back to the full file"""
+        host = urlparse(preview_url).netloc
+        # Hosts with an open (or half-open) circuit are left to download_image
+        if self._get_circuit_breaker(host).opened_at is not None:
+            return False
+        received = 0
+        try:
+            response = self.session.get(preview_url, timeout=15, stream=True)
+            response.raise_for_status()
+            with open(output_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        self.bandwidth.throttle(host, len(chunk))
+                        received += len(chunk)
+                        f.write(chunk)
+            with Image.open(output_path) as img:
+                img.verify()
+            with Image.open(output_path) as img:
+                width, height = img.size
+            if width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE:
+                raise ValueError(f"preview too small: {width}x{height}")
+            return True
+        except Exception as e:
+            logger.info("No usable preview from %s (%s); downloading the full image", preview_url[:100], e)
+            self._safe_delete(output_path)
+            return False
+        finally:
+            with self.lock:
+                self.stats['preview_bytes'] += received
+                self.host_stats[host]['preview_bytes'] += received
+
+    def _download_thumbnail_first(self, image_url, preview_url, output_path):
+        """Decide on a preview and download the full image only if it was approved.
+
+        Returns True/False like download_image, or None when there is no usable
+        preview and the image should be downloaded the usual way.
+        """
+        preview_path = output_path.with_name(f"{output_path.stem}_preview.jpg")
+        if not self._fetch_preview(preview_url, preview_path):
+            return None
+        with self.lock:
+            self.stats['previews'] += 1
+        # The processor removes the preview once it has evaluated it
+        result = self.stream.evaluate(preview_path)
+        if result is ProcessorStream.PREVIEW_FAILED:
+            # Download the full image the usual way; the processor evaluates that instead
+            return None
+        if result is None:
+            with self.lock:
+                self.stats['rejected_on_preview'] += 1
+            logger.info("Decided on preview, full image not downloaded: %s", image_url[:100])
+            return True
+        if not self.download_image(image_url, output_path):
+            return False
+        logger.info("Downloaded approved image: %s", image_url[:100])
+        self.stream.commit(output_path, result)
+        return True
+
+    def _log_outcome(self, output_path, decision):
+        """Record a decision made before the processor sees the image"""
+        with self.lock:
+            OUTCOME_LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(OUTCOME_LOG_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'file': output_path.name, 'decision': decision}) + "\n")
+
+    def _park_url(self, image_url):
+        with self.lock:
+            self.parked_urls.add(image_url)
+
+    def _record_permanent_failure(self, image_url):
+        with self.lock:
+            self.stats['permanent_failures'] += 1
+            # Broken links would otherwise be retried on every future run
+            self._remove_url_from_file(image_url)
+
     def download_image(self, image_url, output_path, max_retries=MAX_RETRIES):
         """Download and validate a single image"""
+        host = urlparse(image_url).netloc
+        breaker = self._get_circuit_breaker(host)
+        
         for attempt in range(max_retries + 1):
+            # In the retry pass, URLs behind a half-open trial wait for it instead of
+            # being parked again, so a recovered host gets all of its URLs retried
+            if not breaker.allow_request(wait=self.retrying_parked):
+                logger.info("Circuit open for %s, parking: %s", host, image_url[:100])
+                self._park_url(image_url)
+                return False
+                
             temp_output = output_path.with_suffix('.tmp')
+            received = 0
             try:
                 response = self.session.get(image_url, timeout=15, stream=True)
                 response.raise_for_status()
                 
                 # Check content length
                 content_length = response.headers.get('Content-Length')
+                cl = None
                 if content_length:
                     try:
                         cl = int(content_length)
                         max_bytes = 10 * 1024 * 1024
                         if cl > max_bytes:
                             logger.info("Skipping large image (>10MB): %s", image_url)
+                            breaker.record_success()
                             self._safe_delete(temp_output)
                             return False
                     except ValueError:
@@ -174,25 +839,65 @@ class ImageDownloader:
                 
                 # Download to temporary file
                 with open(temp_output, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                         if chunk:
+                            self.bandwidth.throttle(host, len(chunk))
+                            received += len(chunk)
                             f.write(chunk)
+                # Content-Encoding can make the body longer than Content-Length, never shorter
+                if cl is not None and received < cl and not response.headers.get('Content-Encoding'):
+                    raise requests.exceptions.ChunkedEncodingError(f"body ended after {received} of {cl} bytes")
+                breaker.record_success()
                 
-                # Verify and process the image
-                try:
-                    with Image.open(temp_output) as img:
-                        img.verify()  # Verify it's a valid image
+            except Exception as e:
+                self._account_bytes(host, received, kept=False)
+                self._safe_delete(temp_output)
+                self._safe_delete(output_path)
+                if not self._is_retryable(e):
+                    if isinstance(e, requests.HTTPError):
+                        # The host answered, so it is not the host that is failing
+                        breaker.record_success()
+                    else:
+                        # A bad URL, redirect loop or local write error: no verdict on the host,
+                        # but a half-open trial must not stay in flight
+                        breaker.release_trial()
+                    if self._is_permanent(e):
+                        logger.warning("Permanent failure for %s: %s", image_url, e)
+                        self._record_permanent_failure(image_url)
+                    else:
+                        # Keep the link for the retry pass and the next run
+                        log = logger.error if self._is_local_io_error(e) else logger.warning
+                        log("Download of %s failed, keeping the link: %s", image_url, e)
+                        self._park_url(image_url)
+                    return False
                     
-                    # Re-open for processing
-                    with Image.open(temp_output) as img:
-                        width, height = img.size
-                        
-                        # Check minimum size
-                        if width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE:
-                            logger.info("Image too small: %dx%d", width, height)
-                            self._safe_delete(temp_output)
-                            return False
-                        
+                breaker.record_failure()
+                logger.warning("Download attempt %d failed for %s: %s", attempt + 1, image_url, e)
+                if attempt < max_retries:
+                    time.sleep(self._backoff_delay(attempt, e))
+                    continue
+                self._park_url(image_url)
+                return False
+            
+            # Verify and process the image
+            try:
+                with Image.open(temp_output) as img:
+                    img.verify()  # Verify it's a valid image
+                
+                # Re-open for processing
+                with Image.open(temp_output) as img:
+                    width, height = img.size
+                    
+                    # Check minimum size
+                    if width < MIN_IMAGE_SIZE or height < MIN_IMAGE_SIZE:
+                        logger.info("Image too small: %dx%d", width, height)
+                        self._log_outcome(output_path, 'too_small')
+                        self._account_bytes(host, received, kept=False)
+                        self._safe_delete(temp_output)
+                        return False
+                    
+                    store_mode = self._choose_store_mode(img)
+                    if store_mode == 're_encode':
                         # Convert and resize if needed
                         if img.mode != 'RGB':
                             img = img.convert('RGB')
@@ -203,27 +908,43 @@ class ImageDownloader:
                         
                         # Save final image
                         img.save(output_path, 'JPEG', quality=100, optimize=True)
-                        
-                    # Clean up temp file
-                    self._safe_delete(temp_output)
-                    return True
+                
+                # Files are only moved once Pillow has released them
+                if store_mode == 'lossless_transcode' and not self._lossless_transcode(temp_output, output_path):
+                    with Image.open(temp_output) as img:
+                        img.convert('RGB').save(output_path, 'JPEG', quality=100, optimize=True)
+                    store_mode = 're_encode'
+                elif store_mode == 'pass_through':
+                    os.replace(str(temp_output), str(output_path))
+                
+                with self.lock:
+                    self.stats[self.STORE_MODE_STATS[store_mode]] += 1
+                self._account_bytes(host, received, kept=True)
                     
-                except Exception as img_error:
-                    logger.warning("Image processing failed: %s", img_error)
-                    self._safe_delete(temp_output)
-                    self._safe_delete(output_path)
+                # Clean up temp file
+                self._safe_delete(temp_output)
+                return True
+                
+            except Exception as img_error:
+                self._account_bytes(host, received, kept=False)
+                self._safe_delete(temp_output)
+                self._safe_delete(output_path)
+                if self._is_truncated(img_error):
+                    # The transfer ended early without the connection reporting it
+                    logger.warning("Download attempt %d truncated for %s: %s", attempt + 1, image_url, img_error)
                     if attempt < max_retries:
-                        time.sleep(1)
+                        time.sleep(self._backoff_delay(attempt, img_error))
                         continue
+                    self._park_url(image_url)
                     return False
-                    
-            except Exception as e:
-                logger.warning("Download attempt %d failed for %s: %s", attempt + 1, image_url, e)
-                self._safe_delete(temp_output)
-                self._safe_delete(output_path)
-                if attempt < max_retries:
-                    time.sleep(1)
-                    continue
+                if self._is_local_io_error(img_error):
+                    # Could not write the result here; nothing is wrong with the image
+                    logger.error("Could not store %s, keeping the link: %s", image_url, img_error)
+                    self._park_url(image_url)
+                    return False
+                # A complete body that does not decode will not decode on a retry either
+                logger.warning("Image processing failed: %s", img_error)
+                self._record_permanent_failure(image_url)
                 return False
         
         return False
@@ -231,51 +952,119 @@ class ImageDownloader:
     def download_images(self, image_urls):
         """Download multiple images concurrently"""
         TMP_DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        started = time.monotonic()
         
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {}
+        try:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {}
             
-            for image_url in image_urls:
-                # Check if already downloaded
-                img_hash = self._get_image_hash(image_url)
-                if img_hash in self.downloaded_hashes:
-                    with self.lock:
-                        self.stats['skipped_duplicates'] += 1
-                    continue
+                for image_url in image_urls:
+                    # Check if already downloaded
+                    img_hash = self._get_image_hash(image_url)
+                    if img_hash in self.downloaded_hashes:
+                        with self.lock:
+                            self.stats['skipped_duplicates'] += 1
+                        continue
                 
-                # Create filename from URL hash
-                filename = f"temp_{img_hash}.jpg"
-                output_path = TMP_DOWNLOAD_DIR / filename
+                    # Create filename from URL hash
+                    filename = f"temp_{img_hash}.jpg"
+                    output_path = TMP_DOWNLOAD_DIR / filename
                 
-                future = executor.submit(self._download_single, image_url, output_path, img_hash)
-                futures[future] = (image_url, output_path, img_hash)
+                    future = executor.submit(self._download_single, image_url, output_path, img_hash)
+                    futures[future] = (image_url, output_path, img_hash)
             
-            # Process completed downloads
-            for future in as_completed(futures):
-                image_url, output_path, img_hash = futures[future]
-                try:
-                    success = future.result()
-                    if success:
-                        with self.lock:
-                            self.stats['successful_downloads'] += 1
-                            self.downloaded_hashes.add(img_hash)
-                            self._save_downloaded_hash(img_hash)
-                            # Remove the URL from the links file immediately
-                            self._remove_url_from_file(image_url)
-                    else:
+                # Process completed downloads
+                for future in as_completed(futures):
+                    image_url, output_path, img_hash = futures[future]
+                    try:
+                        success = future.result()
+                        if success:
+                            with self.lock:
+                                self.stats['successful_downloads'] += 1
+                                self.downloaded_hashes.add(img_hash)
+                                # Remove the URL from the links file immediately
+                                self._remove_url_from_file(image_url)
+                        else:
+                            with self.lock:
+                                if image_url in self.parked_urls:
+                                    self.stats['parked_urls'] += 1
+                                else:
+                                    self.stats['failed_downloads'] += 1
+                    except Exception as e:
+                        logger.error("Unexpected error downloading %s: %s", image_url, e)
                         with self.lock:
                             self.stats['failed_downloads'] += 1
-                except Exception as e:
-                    logger.error("Unexpected error downloading %s: %s", image_url, e)
-                    with self.lock:
-                        self.stats['failed_downloads'] += 1
+        finally:
+            # Persist any digests still waiting in the append batch
+            self.downloaded_hashes.flush()
+            self.transfer_seconds += time.monotonic() - started
+
+    def retry_parked_urls(self):
+        """Retry pass over URLs parked by open circuits or exhausted retries"""
+        with self.lock:
+            parked = sorted(self.parked_urls)
+            self.parked_urls.clear()
+            breakers = list(self.circuit_breakers.values())
+        if not parked:
+            return
+            
+        wait = min(RETRY_PASS_MAX_WAIT, max((b.seconds_until_retry() for b in breakers), default=0.0))
+        logger.info("Retrying %d parked URLs in %.0fs", len(parked), wait)
+        time.sleep(wait)
+        
+        succeeded_before = self.stats['successful_downloads']
+        parked_before = self.stats['parked_urls']
+        self.retrying_parked = True
+        try:
+            self.download_images(parked)
+        finally:
+            self.retrying_parked = False
+        with self.lock:
+            self.stats['parked_urls'] = parked_before
+            self.stats['recovered_on_retry'] = self.stats['successful_downloads'] - succeeded_before
+            # Whatever is still parked stays in the links file for the next run
+            self.stats['failed_downloads'] += len(self.parked_urls)
+
+    def throughput_mb_per_sec(self):
+        total_bytes = self.stats['image_bytes'] + self.stats['discarded_image_bytes'] + self.stats['preview_bytes']
+        if self.transfer_seconds <= 0:
+            return 0.0
+        return total_bytes / (1024 * 1024) / self.transfer_seconds
+
+    def save_stats(self, stats_file=DOWNLOAD_STATS_FILE):
+        """Write run counters and per-host byte accounting as JSON"""
+        report = {
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'transfer_seconds': round(self.transfer_seconds, 3),
+            'throughput_mb_per_sec': round(self.throughput_mb_per_sec(), 3),
+            'limits': {'global_bytes_per_sec': GLOBAL_BANDWIDTH_LIMIT, 'per_host_bytes_per_sec': PER_HOST_BANDWIDTH_LIMIT},
+            'stats': self.stats,
+            'hosts': dict(sorted(self.host_stats.items(),
+                                 key=lambda item: sum(item[1][key] for key in
+                                                      ('image_bytes', 'discarded_image_bytes', 'preview_bytes')),
+                                 reverse=True)),
+        }
+        stats_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info("Download stats written to %s", stats_file)
 
     def _download_single(self, image_url, output_path, img_hash):
         """Wrapper for single download with logging"""
         logger.info("Downloading: %s", image_url[:100])
+        preview_url = thumbnail_url(image_url) if self.stream is not None and THUMBNAIL_FIRST else None
+        if preview_url is not None:
+            success = self._download_thumbnail_first(image_url, preview_url, output_path)
+            if success is not None:
+                if not success:
+                    logger.warning("Failed to download: %s", image_url[:100])
+                return success
         success = self.download_image(image_url, output_path)
         if success:
             logger.info("Downloaded and removed from queue: %s", image_url[:100])
+            if self.stream is not None:
+                # Blocks while the processor is STREAM_QUEUE_SIZE images behind
+                self.stream.put(output_path)
         else:
             logger.warning("Failed to download: %s", image_url[:100])
         return success
@@ -317,11 +1106,22 @@ def main():
         logger.error("No image URLs to download")
         return
     
-    downloader = ImageDownloader()
+    stream = None
+    if STREAM_TO_PROCESSOR:
+        logger.info("Streaming mode: downloads are processed as they complete")
+        stream = ProcessorStream()
+    
+    downloader = ImageDownloader(stream=stream)
     downloader.stats['total_urls'] = len(image_urls)
     
     # Download images
-    downloader.download_images(image_urls)
+    try:
+        downloader.download_images(image_urls)
+        downloader.retry_parked_urls()
+    finally:
+        if stream is not None:
+            stream.close()
+        downloader.downloaded_hashes.close()
     
     # Print summary
     logger.info("DOWNLOAD SUMMARY:")
@@ -329,6 +1129,21 @@ def main():
     logger.info("Successful downloads: %d", downloader.stats['successful_downloads'])
     logger.info("Failed downloads: %d", downloader.stats['failed_downloads'])
     logger.info("Skipped duplicates: %d", downloader.stats['skipped_duplicates'])
+    logger.info("Permanent failures (not retried): %d", downloader.stats['permanent_failures'])
+    logger.info("Parked for retry pass: %d (recovered: %d)", downloader.stats['parked_urls'], downloader.stats['recovered_on_retry'])
+    logger.info("Kept original bytes: %d", downloader.stats['passed_through'])
+    logger.info("Lossless JPEG transcodes: %d", downloader.stats['lossless_transcoded'])
+    logger.info("Re-encoded: %d", downloader.stats['re_encoded'])
+    logger.info("Image bytes kept: %.1f MB | discarded (failed, invalid or too small): %.1f MB",
+                downloader.stats['image_bytes'] / (1024 * 1024), downloader.stats['discarded_image_bytes'] / (1024 * 1024))
+    if downloader.stats['previews']:
+        logger.info("Thumbnail-first: %d previews (%.1f MB), %d decided without the full image",
+                    downloader.stats['previews'], downloader.stats['preview_bytes'] / (1024 * 1024),
+                    downloader.stats['rejected_on_preview'])
+    logger.info("Throughput: %.2f MB/s", downloader.throughput_mb_per_sec())
+    downloader.save_stats()
+    if stream is not None:
+        return
     logger.info("Temporary images folder: %s", TMP_DOWNLOAD_DIR)
     
     downloaded_images = downloader.get_downloaded_images()
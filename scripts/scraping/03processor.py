@@ -6,18 +6,32 @@ Processor Component - Filters and classifies images, updates CSV
 import os
 import sys
 import logging
+import argparse
+import sqlite3
 from pathlib import Path
 import time
 import csv
+import fnmatch
 import re
 import shutil
 import gc
+import hashlib
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+import zlib
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
 import cv2
 import numpy as np
 from PIL import Image
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.linear_model import LogisticRegression
 
 # Torch for classification
 try:
@@ -29,6 +43,24 @@ except ImportError as e:
     logging.error("PyTorch import failed: %s", e)
     sys.exit(1)
 
+# ONNX Runtime optional (INFERENCE_BACKEND = 'onnx')
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
+# watchdog optional (inotify-backed watch mode; polling is used without it)
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
 # Configuration
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
@@ -61,12 +93,124 @@ COLOR_NAMES = {
     'teal': (0, 128, 128), 'cyan': (0, 255, 255), 'magenta': (255, 0, 255),
 }
 
+# Color naming: RGB values are mapped to COLOR_NAMES through a precomputed table
+# with COLOR_LUT_BITS bits per channel (6 -> 64^3 cells, 256 KB)
+COLOR_LUT_BITS = 6
+
+# Dominant color engine: 'kmeans' (10 restarts, the reference), 'minibatch'
+# (one k-means++ start on mini-batches), 'median_cut', or 'histogram'
+# (coarse RGB histogram, vectorised across a whole batch of images)
+DOMINANT_COLOR_ENGINE = 'kmeans'
+MINIBATCH_KMEANS_BATCH = 2048
+COLOR_HISTOGRAM_BITS = 4
+# The primary color is the 5x5 center patch of an image at least this large
+COLOR_CENTER_MIN_SIDE = 400
+
 MIN_CLASSIFICATION_CONFIDENCE = 0.65
+
+# Body detector: 'separate' runs each Haar cascade's own detectMultiScale;
+# 'shared_pyramid' scans one image pyramid with both cascades and stops at the
+# first confirmed detection. Both check the (much cheaper) skin ratio first
+BODY_DETECTOR_MODE = 'separate'
+HAAR_SCALE_FACTOR = 1.1
+HAAR_GROUP_EPS = 0.2  # detectMultiScale's grouping tolerance
+
+# Rejection thresholds for the body (skin ratio) and text (region count) filters
+SKIN_HSV_LOWER = (0, 20, 70)
+SKIN_HSV_UPPER = (20, 255, 255)
+SKIN_RATIO_THRESHOLD = 0.05
+TEXT_REGION_THRESHOLD = 10
+
+# Text detector: 'full' works on the full-resolution image; 'bounded' first shrinks
+# it by a power of two to at most TEXT_WORKING_MAX_SIDE and counts regions against
+# TEXT_BOUNDED_REGION_THRESHOLD, calibrated to match 'full' with
+# benchmark-processor.py text --calibrate
+TEXT_DETECTOR_MODE = 'full'
+TEXT_WORKING_MAX_SIDE = 1200
+TEXT_BOUNDED_REGION_THRESHOLD = 5
+# Thumbnail-first downloads decide on a small preview. Stages that need detail a
+# preview lacks are run again on the full-resolution file of approved images
+PREVIEW_RECHECK_STAGES = ('text',)
+
+# Stage-0 prefilter: a logistic probe on cheap statistics of the 400px view, trained
+# with --train-prefilter on this pipeline's own decisions. It rejects only images
+# scoring below the threshold that still passes PREFILTER_RECALL_TARGET of the
+# approved images in its validation split; the rest go on to the other stages.
+# It is used whenever PREFILTER_MODEL_PATH exists
+PREFILTER = True
+PREFILTER_MODEL_PATH = SCRIPT_DIR / "prefilter.npz"
+PREFILTER_RECALL_TARGET = 0.98
+PREFILTER_FEATURE_VERSION = 1
+
+# Inference backend: 'eager' (PyTorch), 'torchscript', 'onnx' or 'int8' (statically
+# quantized TorchScript, CPU only). All but eager load the files written by
+# export-model.py next to MODEL_PATH and fall back to eager when those are missing
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager')
+
+# Batched inference: images per forward pass and decode/transform threads
+CLASSIFY_BATCH_SIZE = 16
+PREFETCH_WORKERS = 4
 REJECTED_CATEGORIES = {'Not sure', 'Other', 'Skip'}
 
+# Rejection cascade: stage order adapts to measured cost and rejection rate
+ADAPTIVE_CASCADE = True
+CASCADE_WARMUP_IMAGES = 32
+CASCADE_REORDER_EVERY = 64
+
+# Classifier outputs (logits and penultimate features) are kept per image content
+# hash so thresholds can be re-applied with --redecide instead of re-running the model.
+# Images rejected by another stage are left out even when the classifier saw them
+STORE_CLASSIFIER_OUTPUTS = True
+FEATURE_STORE_DIR = OUTPUT_DIR / ".classifier-outputs"
+REDECIDE_CSV_PATH = OUTPUT_DIR / "redecided-items.csv"
+
+# Result cache: stage outcomes per image content hash, so reruns skip images that
+# were already evaluated. Entries are tied to a fingerprint of the model file and the
+# settings above; bump PIPELINE_VERSION when a stage's code changes its decisions
+RESULT_CACHE = True
+RESULT_CACHE_PATH = OUTPUT_DIR / ".result-cache.sqlite"
+PIPELINE_VERSION = 4
+
+# Every decision is appended here by source file name; the spider's URL scorer
+# learns which links are worth downloading from it
+OUTCOME_LOG_PATH = OUTPUT_DIR / "image_outcomes.jsonl"
+
+# Process pool: 0 keeps everything in-process. Workers are forked after the model
+# is loaded so they share its weights copy-on-write; each gets its own intra-op
+# thread budget and is replaced once its RSS passes WORKER_MAX_RSS_MB
+PROCESS_WORKERS = 0
+TORCH_THREADS_PER_WORKER = None  # None = cpu_count // PROCESS_WORKERS
+WORKER_MAX_RSS_MB = 2048
+
+# Watch mode: directories are rescanned every WATCH_POLL_INTERVAL seconds without
+# watchdog; a file is processed once it has not been modified for WATCH_SETTLE_SECONDS
+WATCH_POLL_INTERVAL = 5.0
+WATCH_SETTLE_SECONDS = 2.0
+WATCH_MANIFEST_PATH = OUTPUT_DIR / ".watch-manifest.sqlite"
+
+# The detectors' 400px and 150px views are decoded with JPEG DCT scaling at the
+# largest 1/2, 1/4 or 1/8 reduction that still covers them, instead of from a full
+# decode. This only applies with TEXT_DETECTOR_MODE = 'bounded': 'full' text
+# detection reads the full-resolution image, which would be a second decode
+REDUCED_DECODE = True
+# The classifier's 224px input can be DCT-reduced the same way, but that shifts its
+# confidences away from training's full decode; compare the two on your own images
+# with `benchmark-processor.py decode` before turning this on
+REDUCED_DECODE_CLASSIFIER = False
+REDUCED_DECODE_FLAGS = {
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+}
+
 # Supported image extensions
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp'}
 
+# Input directories are scanned recursively unless --no-recursive is given
+RECURSIVE_SCAN = True
+# Result stores are flushed every this many chunks during a long run
+STORE_FLUSH_EVERY_CHUNKS = 64
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s %(levelname)s: %(message)s',
@@ -74,29 +218,289 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --------------------
+# IMAGE CONTEXT
+# --------------------
+def file_content_hash(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ImageContext:
+    """Decodes an image once for the filters and lazily caches the views each stage reads.
+
+    Stages accept either a path or an ImageContext, so they can still be
+    called on their own; the processor passes one context through all of them.
+    """
+
+    def __init__(self, image_path):
+        self.path = Path(image_path)
+        self.name = self.path.name
+        self.classification = None
+        self.logits = None
+        self.features = None
+        self._views = {}
+        self._content_hash = None
+
+    def __str__(self):
+        return str(self.path)
+
+    @classmethod
+    def wrap(cls, image):
+        return image if isinstance(image, cls) else cls(image)
+
+    def _view(self, key, build):
+        if key not in self._views:
+            self._views[key] = build()
+        return self._views[key]
+
+    @property
+    def content_hash(self):
+        """MD5 of the file bytes; identifies the image independently of its name"""
+        if self._content_hash is None:
+            self._content_hash = file_content_hash(self.path)
+        return self._content_hash
+
+    def release(self, *keys):
+        """Drop cached views that no later stage needs (all of them by default)"""
+        for key in keys or list(self._views):
+            self._views.pop(key, None)
+
+    @property
+    def bgr(self):
+        return self._view('bgr', lambda: cv2.imread(str(self.path)))
+
+    @property
+    def gray(self):
+        return self._view('gray', lambda: None if self.bgr is None else cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def rgb(self):
+        # Channel-reversed view: no copy of the full-resolution image
+        return None if self.bgr is None else self.bgr[:, :, ::-1]
+
+    @property
+    def size(self):
+        """(width, height) from the file header, without decoding; None if unreadable"""
+        def build():
+            try:
+                with Image.open(self.path) as img:
+                    return img.size
+            except Exception:
+                return None
+        return self._view('size', build)
+
+    def _reduction(self, side):
+        """Largest DCT scaling factor (1, 2, 4 or 8) that keeps both dimensions >= side"""
+        if not REDUCED_DECODE or TEXT_DETECTOR_MODE != 'bounded' or self.size is None:
+            return 1
+        factor = 1
+        while factor < 8 and min(self.size) // (factor * 2) >= side:
+            factor *= 2
+        return factor
+
+    def bgr_reduced(self, side):
+        """BGR image with both dimensions at least side (where the original allows), decoded reduced.
+
+        An image that is already decoded at the same or a higher resolution is reused
+        rather than decoding again, the full-resolution one first.
+        """
+        factor = self._reduction(side)
+        if factor == 1 or self._views.get('bgr') is not None:
+            return self.bgr
+        for cached in (2, 4, 8):
+            if cached <= factor and self._views.get(f'bgr/{cached}') is not None:
+                return self._views[f'bgr/{cached}']
+        return self._view(f'bgr/{factor}', lambda: cv2.imread(str(self.path), REDUCED_DECODE_FLAGS[factor][0]))
+
+    def rgb_reduced(self, side):
+        bgr = self.bgr_reduced(side)
+        return None if bgr is None else bgr[:, :, ::-1]
+
+    def gray_reduced(self, factor):
+        """Grayscale image shrunk by a power-of-two factor, via reduced decoding when nothing is decoded yet"""
+        if factor == 1:
+            return self.gray
+        def build():
+            if REDUCED_DECODE and self._views.get('bgr') is None:
+                return cv2.imread(str(self.path), REDUCED_DECODE_FLAGS[factor][1])
+            if self.gray is None:
+                return None
+            height, width = self.gray.shape[:2]
+            return cv2.resize(self.gray, (max(1, width // factor), max(1, height // factor)),
+                              interpolation=cv2.INTER_AREA)
+        return self._view(f'gray_{factor}', build)
+
+    @property
+    def bgr_400(self):
+        return self._view('bgr_400', lambda: None if self.bgr_reduced(400) is None else
+                          cv2.resize(self.bgr_reduced(400), (400, 400)))
+
+    @property
+    def gray_400(self):
+        return self._view('gray_400', lambda: None if self.bgr_400 is None else cv2.cvtColor(self.bgr_400, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def hsv_400(self):
+        return self._view('hsv_400', lambda: None if self.bgr_400 is None else cv2.cvtColor(self.bgr_400, cv2.COLOR_BGR2HSV))
+
+    @property
+    def rgb_150(self):
+        # Resizing is per channel, so resize-then-swap equals swap-then-resize
+        return self._view('rgb_150', lambda: None if self.bgr_reduced(150) is None else
+                          np.ascontiguousarray(cv2.resize(self.bgr_reduced(150), (150, 150))[:, :, ::-1]))
+
+    def tensor(self, transform, side=224):
+        """Model input decoded by PIL, as in training (DCT-reduced towards side with REDUCED_DECODE_CLASSIFIER).
+
+        OpenCV and PIL decode JPEGs slightly differently, so this does not reuse the
+        shared BGR decode; it also keeps refusing truncated files like before.
+        """
+        def build():
+            with Image.open(self.path) as img:
+                if REDUCED_DECODE_CLASSIFIER:
+                    img.draft('RGB', (side, side))
+                return transform(img.convert('RGB'))
+        return self._view('tensor', build)
+
 # --------------------
 # CLASSIFIER
 # --------------------
-class ClothingClassifier:
-    def __init__(self, model_path):
-        logger.info("Loading model from %s...", model_path)
-        self.model = models.resnet50(pretrained=False)
-        num_ftrs = self.model.fc.in_features
-        self.model.fc = nn.Linear(num_ftrs, len(CATEGORY_NAMES))
+def exported_model_paths(model_path):
+    """Where export-model.py writes the TorchScript, ONNX and INT8 forms of a .pth model"""
+    model_path = Path(model_path)
+    return {
+        'torchscript': model_path.with_name(model_path.stem + '.torchscript.pt'),
+        'onnx': model_path.with_name(model_path.stem + '.onnx'),
+        'int8': model_path.with_name(model_path.stem + '.int8.pt'),
+        # Plain state dict re-saved for memory-mapped loading; see load_state_dict_mmap
+        'weights': model_path.with_name(model_path.stem + '.weights.pt'),
+    }
 
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        try:
-            state = torch.load(model_path, map_location='cpu')
-            if isinstance(state, dict) and 'state_dict' in state:
-                state = state['state_dict']
-            self.model.load_state_dict(state)
-            self.model.to(device)
-            self.model.eval()
-            self.device = device
-            logger.info("Model loaded (device: %s)", device)
-        except Exception as e:
-            logger.exception("Failed to load model: %s", e)
-            raise
+def export_is_stale(export_path, model_path):
+    """True when the .pth was modified after the export was written, i.e. the export is of older weights"""
+    try:
+        return Path(export_path).stat().st_mtime < Path(model_path).stat().st_mtime
+    except OSError:
+        return False
+
+class OnnxModel:
+    """ONNX Runtime session behind the same call interface as the torch model"""
+    def __init__(self, path, threads=0):
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0 = ONNX Runtime default
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+def resolve_backend(model_path, backend=INFERENCE_BACKEND, warn=True):
+    """(backend, file) that load_model will use: the export for backend, or eager
+    PyTorch on model_path when the export is missing, stale or cannot be run."""
+    exported = exported_model_paths(model_path)
+    reason = None
+    if backend == 'eager':
+        return 'eager', Path(model_path)
+    if backend not in ('torchscript', 'int8', 'onnx'):
+        reason = f"Unknown inference backend '{backend}'"
+    elif backend == 'onnx' and not ONNXRUNTIME_AVAILABLE:
+        reason = "onnxruntime is not installed"
+    elif not exported[backend].exists():
+        reason = f"{exported[backend]} not found (run export-model.py)"
+    elif export_is_stale(exported[backend], model_path):
+        reason = f"{exported[backend]} is older than {model_path} (re-run export-model.py)"
+    else:
+        return backend, exported[backend]
+    if warn:
+        logger.warning("%s; using eager PyTorch", reason)
+    return 'eager', Path(model_path)
+
+def load_model(model_path, backend=INFERENCE_BACKEND, device=None):
+    """Load the classifier as a callable from a batch tensor to logits.
+
+    Returns (model, backend actually used).
+    """
+    device = device or torch.device('cpu')
+    backend, path = resolve_backend(model_path, backend)
+    if backend in ('torchscript', 'int8'):
+        # Quantized kernels only exist on the CPU
+        model = torch.jit.load(str(path), map_location='cpu' if backend == 'int8' else device)
+        model.eval()
+        return model, backend
+    if backend == 'onnx':
+        return OnnxModel(path), 'onnx'
+
+    model = build_resnet(load_state_dict_mmap(model_path))
+    model.to(device)
+    model.eval()
+    return model, 'eager'
+
+def _unwrap_state_dict(state):
+    if isinstance(state, dict) and 'state_dict' in state:
+        state = state['state_dict']
+    return state
+
+def load_state_dict_mmap(model_path):
+    """Weights of model_path, memory-mapped from a pre-converted copy where possible.
+
+    The copy (<name>.weights.pt) holds just the state dict in torch's zip format and
+    is rewritten whenever the .pth is newer. Mapping it instead of reading it makes
+    loading near-instant, and every process using the model shares one copy of the
+    weights in the page cache.
+    """
+    model_path = Path(model_path)
+    weights_path = exported_model_paths(model_path)['weights']
+    try:
+        if not weights_path.exists() or weights_path.stat().st_mtime < model_path.stat().st_mtime:
+            state = _unwrap_state_dict(torch.load(model_path, map_location='cpu'))
+            temp_path = weights_path.with_name(f"{weights_path.name}.{os.getpid()}.tmp")
+            torch.save({key: value.contiguous() for key, value in state.items()}, temp_path)
+            os.replace(temp_path, weights_path)
+            logger.info("Wrote memory-mappable weights to %s", weights_path)
+        return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+    except (OSError, TypeError, RuntimeError) as e:
+        # Read-only model directory, or a torch release without mmap loading
+        logger.warning("Memory-mapped weights unavailable (%s); loading %s directly", e, model_path)
+        return _unwrap_state_dict(torch.load(model_path, map_location='cpu'))
+
+def build_resnet(state):
+    """ResNet50 with our classifier head, holding the tensors in state.
+
+    The module is built on the meta device so no time goes into random
+    initialisation, then takes the (memory-mapped) tensors as its parameters.
+    """
+    try:
+        with torch.device('meta'):
+            model = models.resnet50(pretrained=False)
+            model.fc = nn.Linear(model.fc.in_features, len(CATEGORY_NAMES))
+        model.load_state_dict(state, assign=True)
+    except (AttributeError, TypeError):
+        # torch < 2.1: no meta-device construction or assign=True
+        model = models.resnet50(pretrained=False)
+        model.fc = nn.Linear(model.fc.in_features, len(CATEGORY_NAMES))
+        model.load_state_dict(state)
+    return model
+
+class ClothingClassifier:
+    def __init__(self, model_path, batch_size=CLASSIFY_BATCH_SIZE, prefetch_workers=PREFETCH_WORKERS,
+                 backend=INFERENCE_BACKEND):
+        # The model is loaded on first use (or by load()), not here
+        self.model_path = model_path
+        self.requested_backend = backend
+        self.backend = None
+        self.device = None
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Raw outputs of the last classify_batch call: (logits, features or None) per image
+        self.last_outputs = []
+        self._batch_logits = None
+        self._batch_features = None
 
         self.transform = transforms.Compose([
             transforms.Resize((224, 224)),
@@ -107,37 +511,153 @@ class ClothingClassifier:
             )
         ])
 
-    def classify(self, image_path):
-        """Classify image and validate category."""
+        # Decoding and transforms run on worker threads, ahead of the batch being inferred
+        self.batch_size = batch_size
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='classify-prefetch')
+        self.images_classified = 0
+        self.inference_seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load()
+        return self._model
+
+    def load(self):
+        """Load the model now if it has not been loaded yet"""
+        with self._model_lock:
+            if self._model is not None:
+                return
+            logger.info("Loading model from %s...", self.model_path)
+            started = time.perf_counter()
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            try:
+                model, self.backend = load_model(self.model_path, self.requested_backend, device)
+                # ONNX Runtime and the INT8 model run on the CPU, so their inputs stay there
+                self.device = torch.device('cpu') if self.backend in ('onnx', 'int8') else device
+                # The eager model exposes its penultimate features as the input to fc;
+                # exported models only give logits
+                if isinstance(model, nn.Module) and isinstance(getattr(model, 'fc', None), nn.Linear):
+                    model.fc.register_forward_pre_hook(self._capture_features)
+                self._model = model
+                logger.info("Model loaded in %.2fs (backend: %s, device: %s)",
+                            time.perf_counter() - started, self.backend, self.device)
+            except Exception as e:
+                logger.exception("Failed to load model: %s", e)
+                raise
+
+    def _capture_features(self, module, inputs):
+        self._batch_features = inputs[0].detach()
+
+    def reset_after_fork(self):
+        """Give a forked child its own prefetch threads; the parent's do not survive fork()"""
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=self.prefetch_workers, thread_name_prefix='classify-prefetch')
+        # ONNX Runtime's thread pool does not survive fork() either; rebuild the session
+        # with the worker's thread budget
+        if isinstance(self._model, OnnxModel):
+            self._model = OnnxModel(self._model.path, threads=torch.get_num_threads())
+
+    def _load_tensor(self, image):
+        """Decode and transform one image (path or ImageContext); runs on the prefetch threads."""
         try:
-            img = Image.open(image_path).convert('RGB')
-            input_tensor = self.transform(img).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                output = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(output, dim=1)
-                confidence, predicted_idx = torch.max(probabilities, dim=1)
+            if isinstance(image, ImageContext):
+                return image.tensor(self.transform)
+            with Image.open(image) as img:
+                return self.transform(img.convert('RGB'))
+        except Exception as e:
+            logger.warning("Could not load %s for classification: %s", image, e)
+            return None
+
+    def _prefetch(self, image_paths, batch_size):
+        """Yield transformed tensors in order, decoding up to two batches ahead."""
+        paths = iter(image_paths)
+        pending = deque(
+            self.prefetch_pool.submit(self._load_tensor, path)
+            for path in itertools.islice(paths, 2 * batch_size)
+        )
+        while pending:
+            future = pending.popleft()
+            for path in itertools.islice(paths, 1):
+                pending.append(self.prefetch_pool.submit(self._load_tensor, path))
+            yield future.result()
+
+    def _decide(self, clothing_type, confidence_val):
+        """Validate a prediction against the rejection rules."""
+        # Strict validation
+        if clothing_type in REJECTED_CATEGORIES:
+            logger.info("REJECTED: Invalid category '%s'", clothing_type)
+            return "REJECTED", "rejected", 0.0
             
-            clothing_type = CATEGORY_NAMES[predicted_idx.item()]
-            confidence_val = confidence.item()
+        if confidence_val < MIN_CLASSIFICATION_CONFIDENCE:
+            logger.info("REJECTED: Low confidence %.2f for '%s'", confidence_val, clothing_type)
+            return "REJECTED", "rejected", 0.0
             
-            # Strict validation
-            if clothing_type in REJECTED_CATEGORIES:
-                logger.info("REJECTED: Invalid category '%s'", clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            if confidence_val < MIN_CLASSIFICATION_CONFIDENCE:
-                logger.info("REJECTED: Low confidence %.2f for '%s'", confidence_val, clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            category = CLOTHING_CATEGORIES.get(clothing_type, 'uncategorized')
-            if category == 'uncategorized':
-                logger.info("REJECTED: Uncategorized clothing type '%s'", clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            return clothing_type, category, confidence_val
-        except Exception as e:
-            logger.exception("Classification error: %s", e)
+        category = CLOTHING_CATEGORIES.get(clothing_type, 'uncategorized')
+        if category == 'uncategorized':
+            logger.info("REJECTED: Uncategorized clothing type '%s'", clothing_type)
             return "REJECTED", "rejected", 0.0
+            
+        return clothing_type, category, confidence_val
+
+    def _run_batch(self, tensors):
+        """Forward one batch and return (clothing_type, confidence) per image."""
+        model = self.model  # loads on first use, outside the timed section
+        started = time.perf_counter()
+        batch = torch.stack(tensors).to(self.device)
+        self._batch_features = None
+        with torch.no_grad():
+            output = model(batch)
+            probabilities = torch.nn.functional.softmax(output, dim=1)
+            confidences, predicted_idx = torch.max(probabilities, dim=1)
+        self._batch_logits = output.float().cpu().numpy()
+        if self._batch_features is not None:
+            self._batch_features = self._batch_features.float().cpu().numpy()
+        self.inference_seconds += time.perf_counter() - started
+        self.images_classified += len(tensors)
+        return [(CATEGORY_NAMES[idx], conf) for idx, conf in zip(predicted_idx.tolist(), confidences.tolist())]
+
+    def classify(self, image):
+        """Classify image and validate category."""
+        return self.classify_batch([image])[0]
+
+    def classify_batch(self, image_paths, batch_size=None):
+        """Classify several images (paths or ImageContexts) with batched forward passes.
+
+        Returns one (clothing_type, category, confidence) tuple per image, in order.
+        """
+        batch_size = batch_size or self.batch_size
+        results = [("REJECTED", "rejected", 0.0)] * len(image_paths)
+        outputs = [None] * len(image_paths)
+        indices, tensors = [], []
+        
+        def flush():
+            try:
+                for row, (index, (clothing_type, confidence_val)) in enumerate(zip(indices, self._run_batch(tensors))):
+                    results[index] = self._decide(clothing_type, confidence_val)
+                    features = None if self._batch_features is None else self._batch_features[row]
+                    outputs[index] = (self._batch_logits[row], features)
+            except Exception as e:
+                logger.exception("Classification error: %s", e)
+            indices.clear()
+            tensors.clear()
+        
+        for index, tensor in enumerate(self._prefetch(image_paths, batch_size)):
+            if tensor is None:
+                continue
+            indices.append(index)
+            tensors.append(tensor)
+            if len(tensors) >= batch_size:
+                flush()
+        if tensors:
+            flush()
+        self.last_outputs = outputs
+        return results
+
+    def images_per_second(self):
+        if self.inference_seconds <= 0:
+            return 0.0
+        return self.images_classified / self.inference_seconds
 
 # --------------------
 # BODY DETECTOR
@@ -161,50 +681,100 @@ class BodyDetector:
         except Exception as e:
             logger.warning("OpenCV cascades not available: %s", e)
 
-    def has_human_body(self, image_path):
+    def has_human_body(self, image, mode=None):
         """Body detection using OpenCV."""
         try:
-            img = cv2.imread(str(image_path))
-            if img is None or img.size == 0:
+            ctx = ImageContext.wrap(image)
+            img_small = ctx.bgr_400
+            if img_small is None or img_small.size == 0:
                 return True
                 
-            img_small = cv2.resize(img, (400, 400))
-            gray = cv2.cvtColor(img_small, cv2.COLOR_BGR2GRAY)
+            gray = ctx.gray_400
             
+            # Skin tone detection: a fraction of the cost of either cascade, so it goes first
+            if self._has_skin_tone(img_small, ctx.hsv_400):
+                logger.info("REJECTED: Skin tones detected")
+                return True
+
+            if (mode or BODY_DETECTOR_MODE) == 'shared_pyramid':
+                detected = self._detect_shared_pyramid(gray)
+                if detected:
+                    logger.info("REJECTED: %s detected", detected)
+                    return True
+                return False
+
             # Face detection
             if self.face_cascade is not None:
-                faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+                faces = self.face_cascade.detectMultiScale(gray, scaleFactor=HAAR_SCALE_FACTOR, minNeighbors=5, minSize=(20, 20))
                 if len(faces) > 0:
                     logger.info("REJECTED: Face detected")
                     return True
 
             # Upper body detection
             if self.upper_body_cascade is not None:
-                upper_bodies = self.upper_body_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3, minSize=(30, 30))
+                upper_bodies = self.upper_body_cascade.detectMultiScale(gray, scaleFactor=HAAR_SCALE_FACTOR, minNeighbors=3, minSize=(30, 30))
                 if len(upper_bodies) > 0:
                     logger.info("REJECTED: Upper body detected")
                     return True
 
-            # Skin tone detection
-            if self._has_skin_tone(img_small):
-                logger.info("REJECTED: Skin tones detected")
-                return True
-
             return False
             
         except Exception as e:
             logger.exception("Body detection error: %s", e)
             return True
 
-    def _has_skin_tone(self, img):
+    def _detect_shared_pyramid(self, gray):
+        """Face or upper-body detection over a single image pyramid; returns what was found, or None.
+
+        Walks the scales detectMultiScale would use, smallest window first. Each
+        level is resized once and scanned by both cascades at their native window
+        size; raw hits are grouped the way detectMultiScale groups them after every
+        level, so the scan stops at the first level that confirms a detection.
+        detectMultiScale scans levels beyond 2x on every row and this mode on every
+        other row, so it can miss detections found only at large scales
+        (benchmark-processor.py body reports the agreement).
+        """
+        detectors = [(name, cascade, cascade.getOriginalWindowSize(), min_size, min_neighbors)
+                     for name, cascade, min_size, min_neighbors in (
+                         ('Face', self.face_cascade, (20, 20), 5),
+                         ('Upper body', self.upper_body_cascade, (30, 30), 3))
+                     if cascade is not None]
+        hits = {name: [] for name, *_ in detectors}
+        height, width = gray.shape[:2]
+        factor = 1.0
+        while detectors:
+            level_size = (int(round(width / factor)), int(round(height / factor)))
+            detectors = [detector for detector in detectors
+                         if level_size[0] > detector[2][0] and level_size[1] > detector[2][1]]
+            level = None
+            for name, cascade, window, min_size, min_neighbors in detectors:
+                scaled_window = (int(round(window[0] * factor)), int(round(window[1] * factor)))
+                if scaled_window[0] < min_size[0] or scaled_window[1] < min_size[1]:
+                    continue
+                if level is None:
+                    level = gray if factor == 1.0 else cv2.resize(gray, level_size, interpolation=cv2.INTER_LINEAR)
+                found = cascade.detectMultiScale(level, scaleFactor=HAAR_SCALE_FACTOR, minNeighbors=0,
+                                                 minSize=window, maxSize=window)
+                if len(found) == 0:
+                    continue
+                hits[name].extend([int(round(x * factor)), int(round(y * factor)), scaled_window[0], scaled_window[1]]
+                                  for x, y, _, _ in found)
+                grouped, _ = cv2.groupRectangles(list(hits[name]), min_neighbors, HAAR_GROUP_EPS)
+                if len(grouped) > 0:
+                    return name
+            factor *= HAAR_SCALE_FACTOR
+        return None
+
+    def _has_skin_tone(self, img, hsv=None):
         """Detect skin tones in image."""
         try:
             if img is None or img.size == 0:
                 return False
                 
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            lower_skin = np.array([0, 20, 70], dtype=np.uint8)
-            upper_skin = np.array([20, 255, 255], dtype=np.uint8)
+            if hsv is None:
+                hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            lower_skin = np.array(SKIN_HSV_LOWER, dtype=np.uint8)
+            upper_skin = np.array(SKIN_HSV_UPPER, dtype=np.uint8)
             
             mask = cv2.inRange(hsv, lower_skin, upper_skin)
             skin_pixels = np.sum(mask > 0)
@@ -214,7 +784,7 @@ class BodyDetector:
                 return False
                 
             skin_ratio = skin_pixels / total_pixels
-            return skin_ratio > 0.05
+            return skin_ratio > SKIN_RATIO_THRESHOLD
         except Exception:
             return False
 
@@ -222,33 +792,25 @@ class BodyDetector:
 # TEXT DETECTOR
 # --------------------
 class TextDetector:
-    def has_text(self, image_path):
+    def has_text(self, image, mode=None):
         """Simple text detection using contour analysis."""
         try:
-            img = cv2.imread(str(image_path))
-            if img is None:
+            ctx = ImageContext.wrap(image)
+            if (mode or TEXT_DETECTOR_MODE) == 'bounded':
+                # Power-of-two steps keep the downscale cheap and match reduced JPEG decoding
+                factor = self.working_reduction(ctx)
+                gray = ctx.gray_reduced(factor)
+                threshold = TEXT_BOUNDED_REGION_THRESHOLD
+            else:
+                factor = 1
+                gray = ctx.gray
+                threshold = TEXT_REGION_THRESHOLD
+            if gray is None:
                 return False
-                
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5,5))
-            grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
-            
-            _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            text_contours = 0
-            for contour in contours:
-                x, y, w, h = cv2.boundingRect(contour)
-                aspect_ratio = w / h
-                area = w * h
-                
-                if (0.1 < aspect_ratio < 10.0 and 
-                    10 < area < (img.shape[0] * img.shape[1] * 0.1) and
-                    h > 5 and w > 5):
-                    text_contours += 1
+            text_regions = self.count_text_regions(gray, 1.0 / factor)
                     
-            if text_contours > 10:
-                logger.info("REJECTED: Text detected (%d text regions)", text_contours)
+            if text_regions > threshold:
+                logger.info("REJECTED: Text detected (%d text regions)", text_regions)
                 return True
                 
             return False
@@ -256,46 +818,406 @@ class TextDetector:
             logger.exception("Text detection error: %s", e)
             return False
 
+    @staticmethod
+    def working_reduction(ctx, max_side=None):
+        """Power-of-two reduction (up to 8) that brings the image within max_side for 'bounded' mode"""
+        max_side = max_side or TEXT_WORKING_MAX_SIDE
+        if ctx.size is None:
+            return 1
+        factor = 1
+        while max(ctx.size) > max_side * factor and factor < 8:
+            factor *= 2
+        return factor
+
+    @staticmethod
+    def count_text_regions(gray, scale=1.0):
+        """Number of text-like regions: outer contours of the Otsu-thresholded
+        morphological gradient with a plausible size and aspect ratio.
+
+        Bounding boxes come from per-contour min/max reductions over all contour
+        points at once instead of a boundingRect call per contour. scale is the
+        size of gray relative to the original image; the minimum region size
+        scales with it.
+        """
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5,5))
+        grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+        
+        _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return 0
+            
+        lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=len(contours))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        points = np.concatenate(contours).reshape(-1, 2)
+        low = np.minimum.reduceat(points, starts)
+        high = np.maximum.reduceat(points, starts)
+        w = (high[:, 0] - low[:, 0] + 1).astype(np.float64)
+        h = (high[:, 1] - low[:, 1] + 1).astype(np.float64)
+        area = w * h
+        
+        text_like = ((w > 0.1 * h) & (w < 10.0 * h) &
+                     (area > 10 * scale * scale) & (area < gray.shape[0] * gray.shape[1] * 0.1) &
+                     (h > 5 * scale) & (w > 5 * scale))
+        return int(np.count_nonzero(text_like))
+
+# --------------------
+# PREFILTER
+# --------------------
+def prefilter_features(ctx):
+    """Cheap statistics of the 400px view: color mix, background plainness, edge layout and skin.
+
+    Bump PREFILTER_FEATURE_VERSION whenever this changes; trained probes record it.
+    """
+    if ctx.bgr_400 is None:
+        raise ValueError("image could not be decoded")
+    small = cv2.resize(ctx.bgr_400, (64, 64), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    pixels = float(small.shape[0] * small.shape[1])
+    
+    hue_saturation = cv2.calcHist([hsv], [0, 1], None, [8, 3], [0, 180, 0, 256]).ravel() / pixels
+    value = cv2.calcHist([hsv], [2], None, [4], [0, 256]).ravel() / pixels
+    # Product shots tend to sit on a plain background that differs from the center
+    scaled = small.astype(np.float32) / 255
+    border = np.concatenate([scaled[:4].reshape(-1, 3), scaled[-4:].reshape(-1, 3),
+                             scaled[4:-4, :4].reshape(-1, 3), scaled[4:-4, -4:].reshape(-1, 3)])
+    center = scaled[16:48, 16:48].reshape(-1, 3)
+    contrast = np.abs(center.mean(axis=0) - border.mean(axis=0)).sum()
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8)).astype(np.float32) / 255
+    edges = grad.reshape(4, 16, 4, 16).mean(axis=(1, 3)).ravel()
+    layout = cv2.resize(gray, (4, 4), interpolation=cv2.INTER_AREA).ravel().astype(np.float32) / 255
+    skin = np.count_nonzero(cv2.inRange(hsv, np.array(SKIN_HSV_LOWER, dtype=np.uint8),
+                                        np.array(SKIN_HSV_UPPER, dtype=np.uint8))) / pixels
+    width, height = ctx.size or small.shape[1::-1]
+    return np.concatenate([
+        hue_saturation, value, border.mean(axis=0), border.std(axis=0), [contrast],
+        edges, [grad.mean()], layout, [skin, np.log(width / height), np.log(width * height / 1e6)],
+    ]).astype(np.float32)
+
+class Prefilter:
+    """Logistic probe over prefilter_features, loaded from a file written by train().
+
+    The file keeps the probe's validation scores for approved and rejected images,
+    so the threshold for any recall target is derived at load time without retraining.
+    """
+
+    def __init__(self, path, recall_target=PREFILTER_RECALL_TARGET):
+        with np.load(path) as data:
+            version = int(data['feature_version'])
+            if version != PREFILTER_FEATURE_VERSION:
+                raise ValueError(f"{path} uses feature version {version}; retrain with --train-prefilter")
+            self.mean, self.scale = data['mean'], data['scale']
+            self.weights, self.bias = data['weights'], float(data['bias'])
+            positive, negative = data['positive_scores'], data['negative_scores']
+        self.recall_target = recall_target
+        # Highest threshold that keeps recall_target of the approved validation images
+        self.threshold = float(np.quantile(positive, 1.0 - recall_target, method='lower'))
+        self.expected_recall = float(np.mean(positive >= self.threshold))
+        self.expected_rejection = float(np.mean(negative < self.threshold))
+
+    def scores(self, features):
+        """Probability of approval for each row of features"""
+        logits = ((features - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def reject_batch(self, contexts):
+        """True for images scoring below the threshold; images without features are passed on"""
+        rejected = [False] * len(contexts)
+        rows, features = [], []
+        for row, ctx in enumerate(contexts):
+            try:
+                features.append(prefilter_features(ctx))
+                rows.append(row)
+            except Exception as e:
+                logger.warning("Prefilter could not read %s: %s", ctx.path, e)
+        if features:
+            for row, score in zip(rows, self.scores(np.stack(features))):
+                if score < self.threshold:
+                    logger.info("REJECTED: Prefilter score %.3f", score)
+                    rejected[row] = True
+        return rejected
+
+    @staticmethod
+    def train(features, approved, path, recall_target=PREFILTER_RECALL_TARGET,
+              validation_fraction=0.25, min_per_class=20, seed=0):
+        """Fit the probe on a held-out split of labelled features, write it to path and load it"""
+        approved = np.asarray(approved, dtype=bool)
+        rng = np.random.default_rng(seed)
+        validation = np.zeros(len(approved), dtype=bool)
+        for label in (True, False):
+            members = np.flatnonzero(approved == label)
+            if len(members) < min_per_class:
+                raise ValueError(f"need at least {min_per_class} {'approved' if label else 'rejected'} "
+                                 f"images to train the prefilter, got {len(members)}")
+            validation[rng.choice(members, max(1, int(len(members) * validation_fraction)), replace=False)] = True
+        
+        mean = features[~validation].mean(axis=0)
+        scale = features[~validation].std(axis=0)
+        scale[scale == 0] = 1.0
+        model = LogisticRegression(class_weight='balanced', max_iter=2000)
+        model.fit((features[~validation] - mean) / scale, approved[~validation])
+        weights, bias = model.coef_[0].astype(np.float32), float(model.intercept_[0])
+        scores = model.predict_proba((features[validation] - mean) / scale)[:, 1]
+        
+        temp_path = Path(path).with_suffix('.tmp')
+        with open(temp_path, 'wb') as f:
+            np.savez(f, feature_version=PREFILTER_FEATURE_VERSION, mean=mean, scale=scale,
+                     weights=weights, bias=bias,
+                     positive_scores=np.sort(scores[approved[validation]]).astype(np.float32),
+                     negative_scores=np.sort(scores[~approved[validation]]).astype(np.float32))
+        os.replace(temp_path, path)
+        return Prefilter(path, recall_target)
+
+def train_prefilter(image_files, recall_target=PREFILTER_RECALL_TARGET, workers=PROCESS_WORKERS):
+    """Label images with the full pipeline's decisions and fit the prefilter to them.
+
+    Nothing is copied to the catalog. The decisions go into the result cache, which is
+    shared with normal runs whatever their prefilter settings, so retraining on the same
+    images, or a later run over them, reuses the decisions instead of running the stages
+    again (the prefilter's own features are still computed when retraining).
+    """
+    processor = ImageProcessor(workers=workers, prefilter=False)
+    if RESULT_CACHE:
+        processor._result_cache()
+    chunks = processor._chunked(image_files)
+    features, approved = [], []
+    with (ProcessorPool(processor, processor.workers) if processor.workers > 1 else nullcontext()) as pool:
+        if pool is not None:
+            results = pool.map_chunks(chunks)
+        else:
+            results = (result for chunk in chunks for result in processor._evaluate_batch(chunk))
+        for result in results:
+            if result['rejected_by'] == 'processing_errors':
+                # No decision to learn from
+                continue
+            try:
+                features.append(prefilter_features(ImageContext(result['path'])))
+            except Exception as e:
+                logger.warning("Skipping %s: %s", result['path'], e)
+                continue
+            approved.append(result['rejected_by'] is None)
+            if result.get('logits') is not None:
+                processor._feature_store().put(result['content_hash'], result['path'],
+                                               result['logits'], result['features'])
+            processor._cache_result(result)
+    processor._flush_stores()
+    
+    logger.info("Training the prefilter on %d images (%d approved)", len(approved), sum(approved))
+    prefilter = Prefilter.train(np.stack(features), approved, PREFILTER_MODEL_PATH, recall_target)
+    logger.info("Prefilter written to %s", PREFILTER_MODEL_PATH)
+    logger.info("Threshold %.3f for a %.0f%% recall target: on the validation split it passes %.1f%% of "
+                "approved images and rejects %.1f%% of rejected ones", prefilter.threshold,
+                recall_target * 100, prefilter.expected_recall * 100, prefilter.expected_rejection * 100)
+    return prefilter
+
+# --------------------
+# DOMINANT COLOR ENGINES
+# --------------------
+# Each engine takes an (N, 3) RGB pixel array and returns up to n_colors RGB centres
+def _kmeans_colors(pixels, n_colors):
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+    kmeans.fit(pixels)
+    return kmeans.cluster_centers_
+
+def _minibatch_colors(pixels, n_colors):
+    """Single k-means++ initialisation fitted on mini-batches"""
+    kmeans = MiniBatchKMeans(n_clusters=n_colors, init='k-means++', n_init=1,
+                             batch_size=MINIBATCH_KMEANS_BATCH, random_state=42)
+    kmeans.fit(pixels.astype(np.float32))
+    return kmeans.cluster_centers_
+
+def _median_cut_colors(pixels, n_colors):
+    """Split the box with the widest channel at its median until there are n_colors boxes"""
+    boxes = [pixels]
+    while len(boxes) < n_colors:
+        spans = [np.ptp(box, axis=0).max() if len(box) > 1 else -1 for box in boxes]
+        widest = int(np.argmax(spans))
+        if spans[widest] <= 0:
+            break
+        box = boxes.pop(widest)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind='stable')
+        half = len(box) // 2
+        boxes.extend([box[order[:half]], box[order[half:]]])
+    boxes.sort(key=len, reverse=True)
+    return np.array([box.mean(axis=0) for box in boxes])
+
+def _histogram_colors_batch(pixel_sets, n_colors):
+    """Mean color of the n most populated histogram cells, for many images in one pass"""
+    shift = 8 - COLOR_HISTOGRAM_BITS
+    cells = 1 << (3 * COLOR_HISTOGRAM_BITS)
+    pixels = np.concatenate(pixel_sets).astype(np.int64)
+    offsets = np.repeat(np.arange(len(pixel_sets)) * cells, [len(p) for p in pixel_sets])
+    q = pixels >> shift
+    index = offsets + ((q[:, 0] << (2 * COLOR_HISTOGRAM_BITS)) | (q[:, 1] << COLOR_HISTOGRAM_BITS) | q[:, 2])
+    size = len(pixel_sets) * cells
+    counts = np.bincount(index, minlength=size).reshape(len(pixel_sets), cells)
+    sums = np.stack([np.bincount(index, weights=pixels[:, channel], minlength=size) for channel in range(3)],
+                    axis=-1).reshape(len(pixel_sets), cells, 3)
+    top = np.argsort(-counts, axis=1, kind='stable')[:, :n_colors]
+    centres = []
+    for image_index, image_cells in enumerate(top):
+        image_cells = image_cells[counts[image_index, image_cells] > 0]
+        centres.append(sums[image_index, image_cells] / counts[image_index, image_cells, None])
+    return centres
+
+def _histogram_colors(pixels, n_colors):
+    return _histogram_colors_batch([pixels], n_colors)[0]
+
+DOMINANT_COLOR_ENGINES = {
+    'kmeans': _kmeans_colors,
+    'minibatch': _minibatch_colors,
+    'median_cut': _median_cut_colors,
+    'histogram': _histogram_colors,
+}
+
+def dominant_colors_batch(pixel_sets, n_colors, engine=None):
+    """Dominant RGB centres for several images; the histogram engine handles them in one pass"""
+    engine = engine or DOMINANT_COLOR_ENGINE
+    if engine == 'histogram':
+        return _histogram_colors_batch(pixel_sets, n_colors)
+    return [DOMINANT_COLOR_ENGINES[engine](pixels, n_colors) for pixels in pixel_sets]
+
+
 # --------------------
 # COLOR DETECTOR
 # --------------------
+class ColorLUT:
+    """Nearest palette name for RGB values, precomputed over a quantised RGB grid.
+
+    Each channel keeps its top `bits` bits and the nearest palette entry is stored
+    per cell, by LAB or plain RGB distance. Cells that straddle a boundary between
+    two palette entries are flagged and their pixels resolved exactly, so lookups
+    give the same answer as a full palette scan. Works on whole pixel arrays.
+    The table takes a second or two to build, so that happens on the first lookup
+    rather than when the module is imported.
+    """
+    def __init__(self, palette, bits=COLOR_LUT_BITS, space='rgb'):
+        self.names = list(palette)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.space = space
+        self.palette = self._convert(np.array(list(palette.values())))
+        self.table = None
+        self.ambiguous = None
+        self._build_lock = threading.Lock()
+        
+    def build(self):
+        """Compute the table now (a no-op once built)"""
+        with self._build_lock:
+            if self.table is None:
+                self._build()
+        
+    def _build(self):
+        levels = 1 << self.bits
+        step = 1 << self.shift
+        axis = np.arange(levels)
+        cells = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+        centres = self._convert(cells * step + step // 2).astype(np.float32)
+        distances = np.sqrt(((centres[:, None, :] - self.palette[None, :, :].astype(np.float32)) ** 2).sum(axis=2))
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :2]
+        best, second = np.take_along_axis(distances, nearest, axis=1).T
+        table = nearest[:, 0].astype(np.uint8)
+        
+        # Farthest any value in a cell is from its centre. RGB to LAB is not linear, so
+        # the corners do not bound it; every offset within the cell is converted instead
+        radius = np.zeros(len(cells), dtype=np.float32)
+        for offset in itertools.product(range(step), repeat=3):
+            converted = self._convert(cells * step + np.array(offset))
+            radius = np.maximum(radius, np.sqrt(((converted - centres) ** 2).sum(axis=1)))
+        # The small slack covers float32 rounding in the distances above
+        self.ambiguous = second - best <= 2 * radius + 1e-3
+        # Set last: lookups only check the table
+        self.table = table
+        
+    def _convert(self, rgb):
+        rgb = np.asarray(rgb).reshape(-1, 3)
+        if self.space != 'lab':
+            return rgb.astype(np.int64)
+        pixels = rgb.astype(np.uint8).reshape(-1, 1, 3)
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2LAB).reshape(-1, 3).astype(np.int64)
+        
+    def _distances(self, converted):
+        """Squared distance from each converted pixel to each palette entry"""
+        return ((converted[:, None, :] - self.palette[None, :, :]) ** 2).sum(axis=2)
+        
+    def lookup(self, pixels):
+        """Palette indices for an (..., 3) array of RGB values"""
+        if self.table is None:
+            self.build()
+        pixels = np.clip(np.asarray(pixels), 0, 255).astype(np.int64)
+        q = pixels >> self.shift
+        cells = (q[..., 0] << (2 * self.bits)) | (q[..., 1] << self.bits) | q[..., 2]
+        indices = self.table[cells]
+        ambiguous = self.ambiguous[cells]
+        if ambiguous.any():
+            indices[ambiguous] = self._distances(self._convert(pixels[ambiguous])).argmin(axis=1)
+        return indices
+        
+    def counts(self, pixels):
+        """Number of pixels mapped to each palette entry"""
+        return np.bincount(self.lookup(pixels).ravel(), minlength=len(self.names))
+        
+    def name(self, rgb):
+        return self.names[int(self.lookup(np.asarray(rgb).reshape(1, 3))[0])]
+
+COLOR_LUT = ColorLUT(COLOR_NAMES)
+
 class ColorDetector:
     @staticmethod
-    def get_dominant_colors(image_path, n_colors=3):
+    def get_dominant_colors(image, n_colors=3, engine=None):
         """Get dominant colors with improved center-based primary color detection."""
+        return ColorDetector.get_dominant_colors_batch([image], n_colors, engine)[0]
+
+    @staticmethod
+    def get_dominant_colors_batch(images, n_colors=3, engine=None):
+        """Dominant color names for several images (paths or ImageContexts), one list per image.
+
+        An image that fails gets an empty list without affecting the others.
+        """
+        results = [[] for _ in images]
+        contexts, pixel_sets = {}, {}
+        for index, image in enumerate(images):
+            try:
+                ctx = ImageContext.wrap(image)
+                if ctx.rgb_150 is not None:
+                    contexts[index] = ctx
+                    pixel_sets[index] = ctx.rgb_150.reshape(-1, 3)
+            except Exception as e:
+                logger.exception("Color detection error for %s: %s", image, e)
+        
+        # Get additional colors from full image using the configured engine
         try:
-            img = cv2.imread(str(image_path))
-            if img is None:
-                return []
-            
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Get primary color from 5x5 center region
-            primary_color_name = ColorDetector._get_center_color(img_rgb)
-            
-            # Get additional colors from full image using k-means
-            img_small = cv2.resize(img_rgb, (150, 150))
-            pixels = img_small.reshape(-1, 3)
-            kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            colors = kmeans.cluster_centers_.astype(int)
-            
-            color_names = [primary_color_name] if primary_color_name else []
-            
-            for color in colors:
-                color_name = ColorDetector._rgb_to_name(tuple(color))
-                if color_name and color_name not in color_names:
-                    color_names.append(color_name)
-            
-            # Ensure we return at least the primary color
-            if not color_names:
-                color_names.append('unknown')
-            
-            return color_names[:n_colors]
-            
+            centres = dict(zip(pixel_sets, dominant_colors_batch(list(pixel_sets.values()), n_colors, engine)))
         except Exception as e:
-            logger.exception("Color detection error: %s", e)
-            return []
+            logger.warning("Batched color detection failed, retrying image by image: %s", e)
+            centres = {}
+            for index, pixels in pixel_sets.items():
+                try:
+                    centres[index] = dominant_colors_batch([pixels], n_colors, engine)[0]
+                except Exception as e:
+                    logger.exception("Color detection error for %s: %s", contexts[index].name, e)
+        
+        for index, image_centres in centres.items():
+            try:
+                # Get primary color from 5x5 center region
+                primary_color_name = ColorDetector._get_center_color(contexts[index].rgb_reduced(COLOR_CENTER_MIN_SIDE))
+                color_names = [primary_color_name] if primary_color_name else []
+                
+                for color in image_centres.astype(int):
+                    color_name = ColorDetector._rgb_to_name(tuple(color))
+                    if color_name and color_name not in color_names:
+                        color_names.append(color_name)
+                
+                # Ensure we return at least the primary color
+                if not color_names:
+                    color_names.append('unknown')
+                
+                results[index] = color_names[:n_colors]
+            except Exception as e:
+                logger.exception("Color detection error for %s: %s", contexts[index].name, e)
+        return results
 
     @staticmethod
     def _get_center_color(img_rgb):
@@ -328,14 +1250,7 @@ class ColorDetector:
     @staticmethod
     def _rgb_to_name(rgb):
         """Map RGB value to nearest color name."""
-        min_distance = float('inf')
-        closest_name = None
-        for name, named_rgb in COLOR_NAMES.items():
-            distance = sum((a - b) ** 2 for a, b in zip(rgb, named_rgb)) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                closest_name = name
-        return closest_name
+        return COLOR_LUT.name(rgb)
 
 # --------------------
 # CSV MANAGER
@@ -366,80 +1281,686 @@ class CatalogCSV:
             writer.writerow(row)
         logger.info("Added item to CSV: %s", item_data['name'])
 
+# --------------------
+# REJECTION CASCADE
+# --------------------
+class CascadeStage:
+    """A rejection filter with running cost and rejection-rate statistics.
+
+    check(ctx) returns True to reject one image; batch_check(contexts) returns
+    one such flag per image and is used for stages that work on whole batches.
+    """
+
+    def __init__(self, name, stat_key, check=None, batch_check=None):
+        self.name = name
+        self.stat_key = stat_key
+        self.check = check
+        self.batch_check = batch_check
+        self.calls = 0
+        self.rejections = 0
+        self.seconds = 0.0
+
+    def evaluate(self, contexts):
+        started = time.perf_counter()
+        if self.batch_check is not None:
+            rejected = list(self.batch_check(contexts))
+        else:
+            rejected = [self._safe_check(ctx) for ctx in contexts]
+        self.seconds += time.perf_counter() - started
+        self.calls += len(contexts)
+        self.rejections += sum(rejected)
+        return rejected
+
+    def _safe_check(self, ctx):
+        try:
+            return self.check(ctx)
+        except Exception as e:
+            logger.exception("Error processing image %s: %s", ctx.path, e)
+            return True
+
+    @property
+    def cost(self):
+        return self.seconds / self.calls if self.calls else 0.0
+
+    @property
+    def rejection_rate(self):
+        return self.rejections / self.calls if self.calls else 0.0
+
+    @property
+    def priority(self):
+        """Cost per rejection; running filters in ascending order minimises expected cost"""
+        if self.rejections == 0:
+            return float('inf')
+        return self.cost / self.rejection_rate
+
+class RejectionCascade:
+    """Runs independent rejection filters, cheapest-and-most-selective first.
+
+    An image is approved only if no stage rejects it, so the order never changes
+    the decision, only which stage is credited with a rejection and how much work
+    is skipped. The first CASCADE_WARMUP_IMAGES run every stage to get unbiased
+    estimates; afterwards stages are re-sorted every CASCADE_REORDER_EVERY images.
+    """
+
+    def __init__(self, stages, adaptive=ADAPTIVE_CASCADE,
+                 warmup_images=CASCADE_WARMUP_IMAGES, reorder_every=CASCADE_REORDER_EVERY):
+        self.order = list(stages)
+        self.adaptive = adaptive
+        self.warmup_images = warmup_images
+        self.reorder_every = reorder_every
+        self.images_seen = 0
+        self.last_reorder = 0
+        # Stage orders run since the owner last cleared this; pool workers report them
+        self.orders_used = set()
+
+    def run(self, contexts):
+        """Returns (survivors, {ctx: stage that rejected it})"""
+        explore = self.adaptive and self.images_seen < self.warmup_images
+        rejected_by = {}
+        self.orders_used.add(tuple(stage.name for stage in self.order))
+        for stage in self.order:
+            targets = contexts if explore else [ctx for ctx in contexts if ctx not in rejected_by]
+            if not targets:
+                break
+            for ctx, rejected in zip(targets, stage.evaluate(targets)):
+                if rejected and ctx not in rejected_by:
+                    rejected_by[ctx] = stage
+        self.images_seen += len(contexts)
+        if self.adaptive and self.images_seen >= self.warmup_images and \
+                self.images_seen - self.last_reorder >= self.reorder_every:
+            self._reorder()
+        return [ctx for ctx in contexts if ctx not in rejected_by], rejected_by
+
+    def _reorder(self):
+        self.last_reorder = self.images_seen
+        new_order = sorted(self.order, key=lambda stage: stage.priority)
+        if new_order != self.order:
+            logger.info("Cascade order: %s", " -> ".join(stage.name for stage in new_order))
+        self.order = new_order
+
+    def expected_cost(self):
+        """Estimated seconds per image for the current order, assuming independent filters"""
+        total, pass_probability = 0.0, 1.0
+        for stage in self.order:
+            total += pass_probability * stage.cost
+            pass_probability *= 1.0 - stage.rejection_rate
+        return total
+
+# --------------------
+# CLASSIFIER OUTPUT STORE
+# --------------------
+def model_fingerprint(model_path, backend):
+    """Identifies the model that produced stored outputs; any change invalidates them"""
+    stat = Path(model_path).stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{backend}"
+
+class FeatureStore:
+    """Logits and penultimate features per image content hash, in memory-mapped matrices.
+
+    Rows are appended in arrival order: keys.bin holds the 16-byte digests,
+    logits.f32 and features.f16 the outputs, and paths.txt the source path of
+    each row. meta.json records the row count and the model fingerprint; a
+    store written by a different model is cleared when opened for writing.
+    Features are NaN for backends that only expose logits.
+    """
+    INITIAL_CAPACITY = 1024
+    
+    def __init__(self, directory, fingerprint=None, num_classes=len(CATEGORY_NAMES), feature_dim=2048):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.meta_path = self.directory / "meta.json"
+        self.paths_path = self.directory / "paths.txt"
+        self.num_classes = num_classes
+        self.feature_dim = feature_dim
+        
+        meta = {}
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        if fingerprint is not None and meta.get('fingerprint') not in (None, fingerprint):
+            logger.info("Model changed since classifier outputs were stored; clearing %s", self.directory)
+            meta = {}
+        self.fingerprint = fingerprint or meta.get('fingerprint')
+        self.count = meta.get('count', 0)
+        self.capacity = 0
+        self._open(max(meta.get('capacity', 0), self.INITIAL_CAPACITY), truncate=not meta)
+        
+        self.paths = []
+        if self.count and self.paths_path.exists():
+            with open(self.paths_path, 'r', encoding='utf-8') as f:
+                self.paths = [line.rstrip('\n') for line in itertools.islice(f, self.count)]
+        self.index = {bytes(key): row for row, key in enumerate(self.keys[:self.count])}
+        self.pending_paths = []
+        
+    def _open(self, capacity, truncate=False):
+        """(Re)map the matrices with room for capacity rows, growing the files as needed"""
+        shapes = {'keys.bin': ('S16', ()), 'logits.f32': (np.float32, (self.num_classes,)),
+                  'features.f16': (np.float16, (self.feature_dim,))}
+        arrays = {}
+        for name, (dtype, row_shape) in shapes.items():
+            path = self.directory / name
+            size = capacity * int(np.prod(row_shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            with open(path, 'wb' if truncate or not path.exists() else 'r+b') as f:
+                f.truncate(size)
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r+', shape=(capacity,) + row_shape)
+        if truncate:
+            with open(self.paths_path, 'w', encoding='utf-8'):
+                pass
+        self.keys, self.logits, self.features = arrays['keys.bin'], arrays['logits.f32'], arrays['features.f16']
+        self.capacity = capacity
+        
+    def __len__(self):
+        return self.count
+        
+    def __contains__(self, content_hash):
+        return bytes.fromhex(content_hash) in self.index
+        
+    def put(self, content_hash, path, logits, features=None):
+        key = bytes.fromhex(content_hash)
+        if key in self.index:
+            return
+        if self.count >= self.capacity:
+            self.flush()
+            self._open(self.capacity * 2)
+        row = self.count
+        self.keys[row] = key
+        self.logits[row] = logits
+        self.features[row] = np.nan if features is None else features
+        self.index[key] = row
+        self.paths.append(str(path))
+        self.pending_paths.append(str(path))
+        self.count += 1
+        
+    def flush(self):
+        for array in (self.keys, self.logits, self.features):
+            array.flush()
+        if self.pending_paths:
+            with open(self.paths_path, 'a', encoding='utf-8') as f:
+                f.writelines(path + '\n' for path in self.pending_paths)
+            self.pending_paths.clear()
+        temp_path = self.meta_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': self.fingerprint, 'count': self.count, 'capacity': self.capacity,
+                       'num_classes': self.num_classes, 'feature_dim': self.feature_dim}, f)
+        os.replace(temp_path, self.meta_path)
+
+def redecide(min_confidence=MIN_CLASSIFICATION_CONFIDENCE, rejected_categories=REJECTED_CATEGORIES,
+             clothing_categories=CLOTHING_CATEGORIES):
+    """Re-apply the classification rules to every stored output without running the model.
+
+    Writes one row per stored image to REDECIDE_CSV_PATH and returns the decision counts.
+    """
+    store = FeatureStore(FEATURE_STORE_DIR)
+    if not len(store):
+        logger.warning("No stored classifier outputs in %s", FEATURE_STORE_DIR)
+        return {}
+    if MODEL_PATH.exists() and store.fingerprint.rsplit(':', 1)[0] != model_fingerprint(MODEL_PATH, '')[:-1]:
+        logger.warning("Stored outputs were produced by a different model file than %s", MODEL_PATH)
+    
+    started = time.perf_counter()
+    logits = torch.from_numpy(np.array(store.logits[:store.count]))
+    confidences, predicted = torch.softmax(logits, dim=1).max(dim=1)
+    counts = {'approved': 0, 'rejected_category': 0, 'low_confidence': 0, 'uncategorized': 0}
+    
+    with open(REDECIDE_CSV_PATH, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['path', 'clothing_type', 'category', 'confidence', 'decision'])
+        for path, index, confidence in zip(store.paths, predicted.tolist(), confidences.tolist()):
+            clothing_type = CATEGORY_NAMES[index]
+            category = clothing_categories.get(clothing_type, 'uncategorized')
+            # Same order of checks as ClothingClassifier._decide
+            if clothing_type in rejected_categories:
+                decision = 'rejected_category'
+            elif confidence < min_confidence:
+                decision = 'low_confidence'
+            elif category == 'uncategorized':
+                decision = 'uncategorized'
+            else:
+                decision = 'approved'
+            counts[decision] += 1
+            writer.writerow([path, clothing_type, category, f"{confidence:.4f}", decision])
+    
+    logger.info("Re-decided %d images in %.2fs (min confidence %.2f)", store.count,
+                time.perf_counter() - started, min_confidence)
+    for decision, count in counts.items():
+        logger.info("  %-17s %d", decision, count)
+    logger.info("Decisions written to %s", REDECIDE_CSV_PATH)
+    return counts
+
+# --------------------
+# RESULT CACHE
+# --------------------
+def pipeline_fingerprint(requested_backend):
+    """Hash of everything that decides a stage outcome: the model files and the thresholds.
+
+    The prefilter is left out: only full-pipeline decisions are cached, so they hold
+    with any prefilter, recall target or none (see ImageProcessor._cache_result).
+    """
+    backend, model_file = resolve_backend(MODEL_PATH, requested_backend, warn=False)
+    settings = {
+        'version': PIPELINE_VERSION,
+        # The backend and file load_model will actually use, so a fallback to eager or
+        # a re-export gets its own cache entries
+        'model': [model_fingerprint(MODEL_PATH, backend), model_fingerprint(model_file, backend)],
+        'min_confidence': MIN_CLASSIFICATION_CONFIDENCE,
+        'rejected_categories': sorted(REJECTED_CATEGORIES),
+        'clothing_categories': CLOTHING_CATEGORIES,
+        'skin': [SKIN_HSV_LOWER, SKIN_HSV_UPPER, SKIN_RATIO_THRESHOLD],
+        'body_mode': BODY_DETECTOR_MODE,
+        'text': [TEXT_DETECTOR_MODE, TEXT_REGION_THRESHOLD, TEXT_WORKING_MAX_SIDE, TEXT_BOUNDED_REGION_THRESHOLD],
+        'colors': [COLOR_NAMES, COLOR_LUT_BITS, DOMINANT_COLOR_ENGINE],
+        'reduced_decode': [REDUCED_DECODE, REDUCED_DECODE_CLASSIFIER],
+    }
+    return hashlib.md5(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+class ResultCache:
+    """Evaluation results keyed by image content hash, in SQLite.
+
+    Only entries written under the current pipeline fingerprint are returned;
+    older ones are deleted when the cache is opened for a different fingerprint.
+    Forked pool workers read through their own connection and the parent is the
+    only writer.
+    """
+    RESULT_FIELDS = ('rejected_by', 'clothing_type', 'category', 'confidence', 'colors', 'saved_as')
+    
+    def __init__(self, path, fingerprint):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self._conn = None
+        self._conn_pid = None
+        conn = self._connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(content_hash TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, result TEXT NOT NULL)")
+            stale = conn.execute("DELETE FROM results WHERE fingerprint != ?", (fingerprint,)).rowcount
+        if stale:
+            logger.info("Pipeline changed; dropped %d cached results", stale)
+    
+    def _connection(self):
+        # A connection must not be shared across fork()
+        if self._conn is None or self._conn_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn_pid = os.getpid()
+        return self._conn
+    
+    def get(self, content_hash):
+        row = self._connection().execute(
+            "SELECT result FROM results WHERE content_hash = ? AND fingerprint = ?",
+            (content_hash, self.fingerprint)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def put(self, content_hash, result):
+        entry = {field: result.get(field) for field in self.RESULT_FIELDS}
+        self._connection().execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                   (content_hash, self.fingerprint, json.dumps(entry)))
+    
+    def flush(self):
+        self._connection().commit()
+    
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM results WHERE fingerprint = ?",
+                                          (self.fingerprint,)).fetchone()[0]
+
 # --------------------
 # MAIN PROCESSOR
 # --------------------
 class ImageProcessor:
-    def __init__(self, input_directory):
-        self.input_directory = Path(input_directory)
+    def __init__(self, input_directory=None, workers=PROCESS_WORKERS, prefilter=PREFILTER,
+                 recall_target=PREFILTER_RECALL_TARGET):
+        self.input_directory = Path(input_directory) if input_directory else None
+        self.workers = workers
+        if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning("Process pool needs fork(); running in-process instead")
+            self.workers = 0
         FINAL_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
         self.classifier = ClothingClassifier(MODEL_PATH)
         self.body_detector = BodyDetector()
         self.text_detector = TextDetector()
         self.color_detector = ColorDetector()
         self.csv_manager = CatalogCSV(CSV_PATH)
+        self.prefilter = self._load_prefilter(recall_target) if prefilter else None
+        stages = [
+            CascadeStage('body', 'images_with_body', check=self._check_body),
+            CascadeStage('text', 'images_with_text', check=self._check_text),
+            CascadeStage('classifier', 'invalid_category', batch_check=self._check_classification),
+        ]
+        if self.prefilter is not None:
+            stages.insert(0, CascadeStage('prefilter', 'images_prefiltered', batch_check=self.prefilter.reject_batch))
+        self.cascade = RejectionCascade(stages)
+        self.decode_seconds = 0.0
+        self.feature_store = None
+        self.result_cache = None
+        self.pending_outcomes = []
         self.stats = {
             'total_images': 0,
+            'images_prefiltered': 0,
             'images_with_body': 0,
             'images_with_text': 0,
             'invalid_category': 0,
             'images_saved': 0,
-            'items_added': 0
+            'items_added': 0,
+            'cache_hits': 0,
+            'already_cataloged': 0,
+            'processing_errors': 0,
+            'stream_latency_total': 0.0
         }
 
-    def process_images(self):
-        """Process all image files in input directory"""
-        # Find all image files regardless of filename
-        image_files = []
-        for ext in IMAGE_EXTENSIONS:
-            image_files.extend(self.input_directory.glob(f"*{ext}"))
-            image_files.extend(self.input_directory.glob(f"*{ext.upper()}"))
+    def process_images(self, image_files=None):
+        """Process image files: any iterable of paths, by default everything under input_directory.
+
+        Files are taken from the iterable one chunk at a time, so a generator over a
+        huge tree is never listed in memory.
+        """
+        if image_files is None:
+            image_files = iter_image_files([self.input_directory])
+        if RESULT_CACHE:
+            self._result_cache()  # opened before pool workers fork
         
-        self.stats['total_images'] = len(image_files)
+        # Filters run per image; classification is batched across each chunk
+        chunks = self._chunked(image_files)
+        if self.workers > 1:
+            with ProcessorPool(self, self.workers) as pool:
+                for result in pool.map_chunks(chunks):
+                    self._commit_result(result)
+        else:
+            for chunk in chunks:
+                self._process_batch(chunk)
+        self._flush_stores()
         
-        if not image_files:
-            logger.warning("No image files found in %s", self.input_directory)
+        if not self.stats['total_images']:
+            logger.warning("No image files found in %s", self.input_directory or "the given directories")
             return
             
-        logger.info("Found %d image files to process", len(image_files))
-        
-        for image_path in image_files:
-            self._process_single_image(image_path)
-            
         self._print_summary()
 
+    def _chunked(self, image_files):
+        """Batches of classifier batch size from image_files, counted as they are read"""
+        image_files = iter(image_files)
+        for number in itertools.count(1):
+            chunk = list(itertools.islice(image_files, self.classifier.batch_size))
+            if not chunk:
+                return
+            self.stats['total_images'] += len(chunk)
+            if number % STORE_FLUSH_EVERY_CHUNKS == 0:
+                self._flush_stores()
+                logger.info("%d images read so far", self.stats['total_images'])
+            yield chunk
+
+    def process_stream(self, image_queue, remove_source=True):
+        """Process (image_path, enqueued_at) items from a queue until a None sentinel.
+
+        Used by the downloader's streaming mode so that classification overlaps
+        with downloading instead of waiting for a separate run over tmp_images.
+        Thumbnail-first downloads add a third element: a Future asks for a preview
+        to be evaluated and receives the result if the full-resolution file is
+        wanted (None otherwise); that file then arrives with the result dict,
+        which is committed without evaluating the image again.
+        """
+        logger.info("Processor waiting for streamed images...")
+        while True:
+            item = image_queue.get()
+            try:
+                if item is None:
+                    break
+                image_path, enqueued_at, *phase = item
+                image_path = Path(image_path)
+                decided = True
+                if not phase:
+                    self.stats['total_images'] += 1
+                    self._process_single_image(image_path)
+                elif isinstance(phase[0], Future):
+                    # The download worker waits on this future
+                    try:
+                        result = self._evaluate_preview(image_path)
+                    except Exception as e:
+                        # Not counted: the full-resolution file is streamed in as a normal image
+                        phase[0].set_exception(e)
+                        decided = False
+                    else:
+                        self.stats['total_images'] += 1
+                        phase[0].set_result(result)
+                        decided = result is None
+                else:
+                    self._commit_result(self._recheck_full_resolution(image_path, phase[0]))
+                if decided:
+                    self.stats['stream_latency_total'] += time.monotonic() - enqueued_at
+                if remove_source:
+                    try:
+                        image_path.unlink()
+                    except OSError as e:
+                        logger.warning("Could not remove streamed image %s: %s", image_path, e)
+            finally:
+                image_queue.task_done()
+        self._flush_stores()
+                
+        self._print_summary()
+
+    def watch(self, roots, interval=WATCH_POLL_INTERVAL, **scan_options):
+        """Process new images arriving under roots until interrupted.
+
+        The model is loaded once up front and stays loaded; each poll's settled
+        arrivals are processed as a batch and recorded in the watch manifest.
+        scan_options (recursive, include, exclude, shard) are those of iter_image_files.
+        """
+        manifest = WatchManifest(WATCH_MANIFEST_PATH)
+        watcher = DirectoryWatcher(roots, interval, **scan_options)
+        self.classifier.load()
+        if RESULT_CACHE:
+            self._result_cache()
+        pending = set()
+        try:
+            with (ProcessorPool(self, self.workers) if self.workers > 1 else nullcontext()) as pool:
+                while True:
+                    pending |= watcher.poll()
+                    arrivals = []
+                    now = time.time()
+                    for path in sorted(pending):
+                        try:
+                            stat = path.stat()
+                        except OSError:
+                            pending.discard(path)  # removed before it settled
+                            continue
+                        # Still being written
+                        if now - stat.st_mtime < WATCH_SETTLE_SECONDS:
+                            continue
+                        pending.discard(path)
+                        if manifest.is_new(path, stat):
+                            arrivals.append((path, stat))
+                    if arrivals:
+                        self._process_arrivals(arrivals, manifest, pool)
+        except KeyboardInterrupt:
+            logger.info("Watch mode stopped")
+        finally:
+            watcher.stop()
+            manifest.close()
+            self._flush_stores()
+            self._print_summary()
+
+    def _process_arrivals(self, arrivals, manifest, pool=None):
+        logger.info("Processing %d new image(s)", len(arrivals))
+        self.stats['total_images'] += len(arrivals)
+        stats_by_path = {str(path): stat for path, stat in arrivals}
+        paths = [path for path, _ in arrivals]
+        chunks = [paths[start:start + self.classifier.batch_size]
+                  for start in range(0, len(paths), self.classifier.batch_size)]
+        if pool is not None:
+            results = pool.map_chunks(chunks)
+        else:
+            results = (result for chunk in chunks for result in self._evaluate_batch(chunk))
+        for result in results:
+            self._commit_result(result)
+            if result['rejected_by'] == 'processing_errors':
+                # Left out of the manifest so the image is tried again once it changes
+                # (or on the next start), e.g. when it was still being written
+                continue
+            content_hash = result.get('content_hash')
+            if content_hash is None:
+                try:
+                    content_hash = file_content_hash(result['path'])
+                except OSError as e:
+                    logger.warning("Not recording %s in the watch manifest: %s", result['path'], e)
+                    continue
+            manifest.record(result['path'], stats_by_path[result['path']], content_hash)
+        manifest.flush()
+        self._flush_stores()
+
+    def _evaluate_preview(self, image_path):
+        """Phase one of a thumbnail-first download: run every stage on the preview.
+
+        Rejections (and images already in the catalog) are committed here and give
+        None; an approval is returned so it can be committed with the full-resolution file.
+        Raises if the preview could not be evaluated, so the full image is downloaded instead.
+
+        Preview logits describe the thumbnail rather than the image, so they are kept out of
+        the feature store. The result cache entry is keyed by the preview's content hash
+        (what a later fetch of the same preview is looked up by) even though an approval
+        is committed with the full-resolution file's path.
+        """
+        result, = self._evaluate_batch([image_path])
+        if result['rejected_by'] == 'processing_errors':
+            raise ValueError(f"could not evaluate preview {Path(image_path).name}")
+        result = {key: value for key, value in result.items() if key not in ('logits', 'features')}
+        if result['rejected_by'] or self._already_cataloged(result):
+            self._commit_result(result)
+            return None
+        return result
+
+    def _recheck_full_resolution(self, image_path, result):
+        """Phase two: run PREVIEW_RECHECK_STAGES on the full-resolution file of an approved preview"""
+        ctx = ImageContext(image_path)
+        for stage in self.cascade.order:
+            if stage.name in PREVIEW_RECHECK_STAGES and stage.evaluate([ctx])[0]:
+                logger.info("Rejected at full resolution by the %s stage: %s", stage.name, ctx.name)
+                result = dict(result, rejected_by=stage.stat_key)
+                break
+        ctx.release()
+        return dict(result, path=str(image_path))
+
     def _process_single_image(self, image_path):
         """Process a single image through the validation pipeline"""
+        self._process_batch([image_path])
+
+    def _process_batch(self, image_paths):
+        """Evaluate a batch of images and commit the results"""
+        for result in self._evaluate_batch(image_paths):
+            self._commit_result(result)
+
+    def _evaluate_batch(self, image_paths):
+        """Run the rejection cascade and colour detection; no files or CSV rows are written.
+
+        Returns one result dict per image. This is the part that runs in pool workers.
+        """
+        results = []
         try:
-            logger.info("Processing: %s", image_path.name)
+            # Each image is decoded once; every stage reads views of the same context
+            contexts = [ImageContext(image_path) for image_path in image_paths]
+            cached = {}
+            if RESULT_CACHE:
+                for ctx in contexts:
+                    hit = self._result_cache().get(ctx.content_hash)
+                    if hit is not None:
+                        logger.info("Cached result for: %s", ctx.name)
+                        cached[ctx] = hit
+            started = time.perf_counter()
+            for ctx in contexts:
+                if ctx not in cached:
+                    logger.info("Processing: %s", ctx.name)
+                    ctx.bgr_400  # decode up front (at the body detector's size) so stage timings exclude it
+            self.decode_seconds += time.perf_counter() - started
             
-            # 1. Check for body parts
-            logger.info("Checking for body parts...")
-            if self.body_detector.has_human_body(image_path):
-                self.stats['images_with_body'] += 1
-                return
-                
-            # 2. Check for text
-            logger.info("Checking for text...")
-            if self.text_detector.has_text(image_path):
-                self.stats['images_with_text'] += 1
-                return
-                
-            # 3. Classify clothing type
-            logger.info("Classifying clothing type...")
-            clothing_type, category, confidence = self.classifier.classify(image_path)
+            results_by_ctx = {ctx: dict(hit, path=str(ctx.path), content_hash=ctx.content_hash, cached=True)
+                              for ctx, hit in cached.items()}
+            contexts_to_run = [ctx for ctx in contexts if ctx not in cached]
             
-            if clothing_type == "REJECTED":
-                self.stats['invalid_category'] += 1
+            survivors, rejected_by = self.cascade.run(contexts_to_run) if contexts_to_run else ([], {})
+            # 4. Get colors (with improved center-based detection), for all approved images at once
+            colors_by_ctx = dict(zip(survivors, self.color_detector.get_dominant_colors_batch(survivors, n_colors=3)))
+            for ctx in contexts_to_run:
+                result = {'path': str(ctx.path), 'rejected_by': None, 'clothing_type': None,
+                          'category': None, 'confidence': 0.0, 'colors': []}
+                # Images the classifier failed on (no logits) are retried on the next run
+                classifier_failed = ctx in rejected_by and rejected_by[ctx].name == 'classifier' and ctx.logits is None
+                if RESULT_CACHE and not classifier_failed:
+                    result['content_hash'] = ctx.content_hash
+                # Only images the classifier decided on: --redecide must not approve
+                # one that the body or text stage rejected
+                decided_by_classifier = ctx not in rejected_by or rejected_by[ctx].name == 'classifier'
+                if STORE_CLASSIFIER_OUTPUTS and ctx.logits is not None and decided_by_classifier:
+                    result.update(content_hash=ctx.content_hash, logits=ctx.logits, features=ctx.features)
+                if ctx in rejected_by:
+                    result['rejected_by'] = rejected_by[ctx].stat_key
+                else:
+                    clothing_type, category, confidence = ctx.classification
+                    logger.info("Classified %s as: %s (%.2f%%)", ctx.name, clothing_type, confidence * 100)
+                    colors = colors_by_ctx[ctx]
+                    logger.info("Colors: %s", ', '.join(colors) if colors else 'unknown')
+                    result.update(clothing_type=clothing_type, category=category,
+                                  confidence=confidence, colors=colors)
+                ctx.release()
+                results_by_ctx[ctx] = result
+            results = [results_by_ctx[ctx] for ctx in contexts]
+        except Exception as e:
+            if len(image_paths) > 1:
+                logger.exception("Error processing batch, retrying its %d images one by one: %s", len(image_paths), e)
+                results = [result for image_path in image_paths for result in self._evaluate_batch([image_path])]
+            else:
+                logger.exception("Error processing %s: %s", image_paths[0] if image_paths else None, e)
+                results = [self._failed_result(image_path) for image_path in image_paths]
+        finally:
+            gc.collect()
+        return results
+
+    @staticmethod
+    def _failed_result(image_path):
+        """Result for an image that could not be evaluated; it has no content hash, so it is not cached"""
+        return {'path': str(image_path), 'rejected_by': 'processing_errors', 'clothing_type': None,
+                'category': None, 'confidence': 0.0, 'colors': []}
+
+    def _check_body(self, ctx):
+        logger.info("Checking %s for body parts...", ctx.name)
+        return self.body_detector.has_human_body(ctx)
+
+    def _check_text(self, ctx):
+        logger.info("Checking %s for text...", ctx.name)
+        return self.text_detector.has_text(ctx)
+
+    def _check_classification(self, contexts):
+        logger.info("Classifying %d image(s)...", len(contexts))
+        results = self.classifier.classify_batch(contexts)
+        for ctx, result, output in zip(contexts, results, self.classifier.last_outputs):
+            ctx.classification = result
+            if output is not None:
+                ctx.logits, ctx.features = output
+        return [result[0] == "REJECTED" for result in results]
+
+    def _commit_result(self, result):
+        """Record an evaluation result and save approved images to the catalog"""
+        image_path = Path(result['path'])
+        if result.get('logits') is not None:
+            self._feature_store().put(result['content_hash'], result['path'], result['logits'], result['features'])
+        if result.get('cached'):
+            self.stats['cache_hits'] += 1
+            if self._already_cataloged(result):
+                self.stats['already_cataloged'] += 1
+                logger.info("Already in catalog as: %s", result['saved_as'])
+                self._log_outcome(image_path, 'approved')
                 return
-                
-            logger.info("Classified as: %s (%.2f%%)", clothing_type, confidence * 100)
+        if result['rejected_by'] == 'processing_errors':
+            # Not a decision about the image, so it is kept out of the outcome log
+            self.stats['processing_errors'] += 1
+            return
+        if result['rejected_by']:
+            self.stats[result['rejected_by']] += 1
+            self._cache_result(result)
+            self._log_outcome(image_path, result['rejected_by'])
+            return
             
-            # 4. Get colors (with improved center-based detection)
-            colors = self.color_detector.get_dominant_colors(image_path, n_colors=3)
+        try:
+            clothing_type, category, colors = result['clothing_type'], result['category'], result['colors']
             primary_color = colors[0] if colors else 'unknown'
             secondary_colors = "|".join(colors[1:3]) if len(colors) > 1 else ''
-            logger.info("Colors: %s", ', '.join(colors) if colors else 'unknown')
             
             # 5. Save valid image and update CSV
             final_filename = self._generate_filename(clothing_type, primary_color)
@@ -473,34 +1994,495 @@ class ImageProcessor:
             self.stats['images_saved'] += 1
             self.stats['items_added'] += 1
             logger.info("APPROVED and saved as: %s", final_filename)
+            self._log_outcome(image_path, 'approved')
+            self._cache_result(dict(result, saved_as=final_filename, cached=False))
             
         except Exception as e:
             logger.exception("Error processing image %s: %s", image_path, e)
-        finally:
-            gc.collect()
+
+    @staticmethod
+    def _already_cataloged(result):
+        """A cached approval whose catalog image is still there: nothing to redo"""
+        return bool(result.get('cached') and result['saved_as'] and (FINAL_IMAGE_DIR / result['saved_as']).exists())
+
+    def _feature_store(self):
+        """Open the classifier output store on first use, once the model (and backend) is known"""
+        if self.feature_store is None:
+            self.feature_store = FeatureStore(FEATURE_STORE_DIR, model_fingerprint(MODEL_PATH, self.classifier.backend))
+        return self.feature_store
+
+    def _result_cache(self):
+        """Open the result cache on first use.
+
+        The fingerprint uses the backend and file the classifier will load, worked out
+        without loading it, so a rerun that hits the cache for every image never has to.
+        """
+        if self.result_cache is None:
+            self.result_cache = ResultCache(RESULT_CACHE_PATH,
+                                            pipeline_fingerprint(self.classifier.requested_backend))
+        return self.result_cache
+
+    def _load_prefilter(self, recall_target):
+        if not PREFILTER_MODEL_PATH.exists():
+            return None
+        try:
+            prefilter = Prefilter(PREFILTER_MODEL_PATH, recall_target)
+        except Exception as e:
+            logger.warning("Prefilter disabled: %s", e)
+            return None
+        logger.info("Prefilter loaded (threshold %.3f: passes %.1f%% of approved and rejects %.1f%% of "
+                    "rejected validation images)", prefilter.threshold,
+                    prefilter.expected_recall * 100, prefilter.expected_rejection * 100)
+        return prefilter
+
+    def _cache_result(self, result):
+        # A prefilter rejection is a guess about what the other stages would decide;
+        # it is not cached, so a run without the prefilter still evaluates the image
+        if result['rejected_by'] == 'images_prefiltered':
+            return
+        if RESULT_CACHE and result.get('content_hash') and not result.get('cached'):
+            self._result_cache().put(result['content_hash'], result)
+
+    def _log_outcome(self, image_path, decision):
+        self.pending_outcomes.append({'file': image_path.name, 'decision': decision})
+
+    def _flush_stores(self):
+        if self.feature_store is not None:
+            self.feature_store.flush()
+        if self.result_cache is not None:
+            self.result_cache.flush()
+        if self.pending_outcomes:
+            OUTCOME_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(OUTCOME_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(outcome) + '\n' for outcome in self.pending_outcomes)
+            self.pending_outcomes.clear()
+
+    def _take_stats_delta(self):
+        """Counters accumulated since the last call; pool workers report these with each result"""
+        current = {
+            'decode_seconds': self.decode_seconds,
+            'images_classified': self.classifier.images_classified,
+            'inference_seconds': self.classifier.inference_seconds,
+            'stages': {stage.name: (stage.calls, stage.rejections, stage.seconds) for stage in self.cascade.order},
+        }
+        # Orders are reported once each rather than as a difference
+        orders = sorted(self.cascade.orders_used)
+        self.cascade.orders_used.clear()
+        previous = getattr(self, '_reported_stats', None)
+        self._reported_stats = current
+        if previous is None:
+            return dict(current, orders=orders)
+        return {
+            'orders': orders,
+            'decode_seconds': current['decode_seconds'] - previous['decode_seconds'],
+            'images_classified': current['images_classified'] - previous['images_classified'],
+            'inference_seconds': current['inference_seconds'] - previous['inference_seconds'],
+            'stages': {name: tuple(now - before for now, before in zip(values, previous['stages'][name]))
+                       for name, values in current['stages'].items()},
+        }
+
+    def _merge_stats_delta(self, delta):
+        self.decode_seconds += delta['decode_seconds']
+        self.classifier.images_classified += delta['images_classified']
+        self.classifier.inference_seconds += delta['inference_seconds']
+        for stage in self.cascade.order:
+            calls, rejections, seconds = delta['stages'].get(stage.name, (0, 0, 0.0))
+            stage.calls += calls
+            stage.rejections += rejections
+            stage.seconds += seconds
+        self.cascade.orders_used.update(tuple(order) for order in delta.get('orders', ()))
 
     def _generate_filename(self, clothing_type, color):
         """Generate final filename"""
         timestamp = int(time.time())
         clean_type = re.sub(r'[^\w\-]', '', clothing_type.lower().replace(' ', '-'))
         clean_color = re.sub(r'[^\w\-]', '', color.lower())
-        return f"{clean_color}-{clean_type}-{timestamp}.jpg"
+        filename = f"{clean_color}-{clean_type}-{timestamp}.jpg"
+        # Batches finish many images within the same second
+        suffix = 1
+        while (FINAL_IMAGE_DIR / filename).exists():
+            suffix += 1
+            filename = f"{clean_color}-{clean_type}-{timestamp}-{suffix}.jpg"
+        return filename
 
     def _print_summary(self):
         logger.info("=" * 60)
         logger.info("PROCESSING SUMMARY")
         logger.info("=" * 60)
         logger.info("Total images processed: %d", self.stats['total_images'])
+        if self.prefilter is not None:
+            logger.info("Rejected - prefilter: %d", self.stats['images_prefiltered'])
         logger.info("Rejected - body parts: %d", self.stats['images_with_body'])
         logger.info("Rejected - text: %d", self.stats['images_with_text'])
         logger.info("Rejected - invalid category: %d", self.stats['invalid_category'])
+        logger.info("Failed - processing errors: %d", self.stats['processing_errors'])
         logger.info("APPROVED product images: %d", self.stats['images_saved'])
         logger.info("Items added to catalog: %d", self.stats['items_added'])
+        if self.stats['cache_hits']:
+            logger.info("Result cache hits: %d (%d already in catalog)",
+                        self.stats['cache_hits'], self.stats['already_cataloged'])
+        logger.info("Classifier throughput: %.1f images/sec (batch size %d)",
+                    self.classifier.images_per_second(), self.classifier.batch_size)
+        if self.workers > 1:
+            logger.info("Process pool: %d workers (figures above are per-worker sums)", self.workers)
+        logger.info("-" * 60)
+        if self.workers > 1:
+            # The parent's cascade never ran: its stages hold the workers' summed figures,
+            # and each worker kept its own order
+            logger.info("Rejection cascade (summed over workers):")
+        else:
+            logger.info("Rejection cascade (current order):")
+        for stage in self.cascade.order:
+            logger.info("  %-10s | %6d images | %5.1f%% rejected | %7.1f ms/image",
+                        stage.name, stage.calls, stage.rejection_rate * 100, stage.cost * 1000)
+        if self.workers > 1:
+            for order in sorted(self.cascade.orders_used):
+                logger.info("  order used by workers: %s", " -> ".join(order))
+            if self.stats['total_images']:
+                logger.info("Decode: %.1f ms/image", self.decode_seconds / self.stats['total_images'] * 1000)
+        elif self.stats['total_images']:
+            logger.info("Decode: %.1f ms/image | expected cascade cost: %.1f ms/image",
+                        self.decode_seconds / self.stats['total_images'] * 1000, self.cascade.expected_cost() * 1000)
+        if self.stats['stream_latency_total'] and self.stats['total_images']:
+            logger.info("Mean download-to-decision latency: %.2fs",
+                        self.stats['stream_latency_total'] / self.stats['total_images'])
         logger.info("=" * 60)
         logger.info("Final images folder: %s", FINAL_IMAGE_DIR)
         logger.info("CSV catalog: %s", CSV_PATH)
         logger.info("=" * 60)
 
+def _rss_mb():
+    """Resident set size of this process in MB (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def _pool_worker(processor, torch_threads, max_rss_mb, tasks, results):
+    """Evaluate chunks from this worker's task queue until told to stop or RSS passes the limit"""
+    pid = os.getpid()
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(1)
+    processor.classifier.reset_after_fork()
+    processor._take_stats_delta()  # counters inherited from the parent are not ours to report
+    
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, image_paths = task
+        try:
+            evaluated = processor._evaluate_batch(image_paths)
+        except Exception as e:
+            logger.exception("Worker %d failed on a chunk of %d images: %s", pid, len(image_paths), e)
+            evaluated = [processor._failed_result(image_path) for image_path in image_paths]
+        results.put(('done', pid, (task_id, evaluated, processor._take_stats_delta())))
+        if max_rss_mb and _rss_mb() > max_rss_mb:
+            results.put(('recycle', pid, None))
+            break
+
+class ProcessorPool:
+    """Forked workers that run ImageProcessor._evaluate_batch; the parent commits results.
+
+    The parent has loaded the model but never run it, so children share the weights
+    copy-on-write. The parent hands each worker its chunks directly, so it always
+    knows what a dead worker was holding: those chunks are requeued once. Workers
+    over WORKER_MAX_RSS_MB finish their current chunk and are replaced.
+    """
+    CHUNKS_PER_WORKER = 2  # one being evaluated, one waiting, so workers never idle between chunks
+    
+    def __init__(self, processor, workers, torch_threads=None, max_rss_mb=None):
+        self.processor = processor
+        self.workers = workers
+        self.torch_threads = torch_threads or TORCH_THREADS_PER_WORKER or max(1, (os.cpu_count() or 1) // workers)
+        self.max_rss_mb = WORKER_MAX_RSS_MB if max_rss_mb is None else max_rss_mb
+        self.context = multiprocessing.get_context('fork')
+        self.results = self.context.Queue()
+        self.processes = {}
+        self.task_queues = {}
+        self.assigned = {}
+        self.recycled = 0
+        
+    def __enter__(self):
+        # Load once in the parent so workers inherit it instead of each loading their own
+        self.processor.classifier.load()
+        COLOR_LUT.build()
+        for _ in range(self.workers):
+            self._spawn()
+        logger.info("Started %d processor workers (%d torch threads each)", self.workers, self.torch_threads)
+        return self
+        
+    def __exit__(self, exc_type, exc, tb):
+        for tasks in self.task_queues.values():
+            tasks.put(None)
+        for process in self.processes.values():
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        if self.recycled:
+            logger.info("Recycled %d workers over the memory limit", self.recycled)
+        return False
+        
+    def _spawn(self):
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_pool_worker,
+            args=(self.processor, self.torch_threads, self.max_rss_mb, tasks, self.results),
+            daemon=True,
+        )
+        process.start()
+        self.processes[process.pid] = process
+        self.task_queues[process.pid] = tasks
+        self.assigned[process.pid] = deque()
+        
+    def _retire(self, pid):
+        """Stop tracking a worker and return the chunks it had not finished"""
+        self.processes.pop(pid).join(timeout=30)
+        self.task_queues.pop(pid).close()
+        return self.assigned.pop(pid)
+        
+    def map_chunks(self, chunks):
+        """Yield evaluation results for every image in chunks, in completion order.
+
+        chunks may be a generator; it is only advanced as workers need more work.
+        """
+        chunk_iter = iter(chunks)
+        chunks_by_id = {}
+        task_ids = itertools.count()
+        pending = deque()
+        requeued = set()
+        
+        def next_task():
+            if pending:
+                return pending.popleft()
+            chunk = next(chunk_iter, None)
+            if chunk is None:
+                return None
+            task_id = next(task_ids)
+            chunks_by_id[task_id] = chunk
+            return task_id
+        
+        def dispatch():
+            for pid, assigned in self.assigned.items():
+                while len(assigned) < self.CHUNKS_PER_WORKER:
+                    task_id = next_task()
+                    if task_id is None:
+                        return
+                    assigned.append(task_id)
+                    self.task_queues[pid].put((task_id, [str(path) for path in chunks_by_id[task_id]]))
+                    
+        def reassign(task_ids):
+            """Requeue a dead worker's chunks; returns the images of chunks that already failed once"""
+            abandoned = []
+            for task_id in task_ids:
+                if task_id in requeued:
+                    chunk = chunks_by_id.pop(task_id)
+                    logger.error("Giving up on a chunk of %d images after a second worker failure", len(chunk))
+                    abandoned.extend(chunk)
+                else:
+                    requeued.add(task_id)
+                    pending.appendleft(task_id)
+            return abandoned
+                    
+        dispatch()
+        while chunks_by_id:
+            try:
+                kind, pid, payload = self.results.get(timeout=1)
+            except queue.Empty:
+                for pid, process in list(self.processes.items()):
+                    if not process.is_alive():
+                        logger.error("Processor worker %d exited with code %s", pid, process.exitcode)
+                        for image_path in reassign(self._retire(pid)):
+                            yield self.processor._failed_result(image_path)
+                        self._spawn()
+                dispatch()
+                continue
+                
+            if kind == 'done':
+                task_id, evaluated, delta = payload
+                if pid in self.assigned and task_id in self.assigned[pid]:
+                    self.assigned[pid].remove(task_id)
+                self.processor._merge_stats_delta(delta)
+                if chunks_by_id.pop(task_id, None) is not None:
+                    yield from evaluated
+            elif kind == 'recycle':
+                self.recycled += 1
+                # Chunks queued behind the one it finished go back to the front
+                pending.extendleft(reversed(self._retire(pid)))
+                self._spawn()
+            dispatch()
+
+# --------------------
+# IMAGE DISCOVERY
+# --------------------
+def parse_shard(value):
+    """'i/n' -> (i, n), with 0 <= i < n"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}")
+    return index, count
+
+def path_selected(rel_path, include=(), exclude=(), shard=None):
+    """Apply include/exclude patterns and sharding to a '/'-separated path relative to its root.
+
+    Shards are assigned from a hash of the relative path, so parallel jobs given the
+    same roots split the files between them without coordinating.
+    """
+    if include and not any(fnmatch.fnmatch(rel_path, pattern) for pattern in include):
+        return False
+    if any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude):
+        return False
+    if shard is not None:
+        index, count = shard
+        return zlib.crc32(rel_path.encode('utf-8', 'surrogateescape')) % count == index
+    return True
+
+def iter_image_files(roots, recursive=RECURSIVE_SCAN, include=(), exclude=(), shard=None):
+    """Yield image files under roots as they are found.
+
+    One os.scandir pass per directory, with a single directory open at a time and
+    nothing listed in memory beyond the directories still to visit. Directories
+    matching an exclude pattern are not entered. Symlinked directories are not followed.
+    """
+    for root in roots:
+        pending_dirs = ['']
+        while pending_dirs:
+            rel_dir = pending_dirs.pop()
+            try:
+                with os.scandir(os.path.join(root, rel_dir)) as entries:
+                    for entry in entries:
+                        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive and not any(fnmatch.fnmatch(rel_path, pattern) for pattern in exclude):
+                                    pending_dirs.append(rel_path)
+                                continue
+                            if not entry.is_file():
+                                continue
+                        except OSError:
+                            continue
+                        if (os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and
+                                path_selected(rel_path, include, exclude, shard)):
+                            yield Path(entry.path)
+            except OSError as e:
+                logger.warning("Cannot scan %s: %s", os.path.join(root, rel_dir), e)
+
+# --------------------
+# WATCH MODE
+# --------------------
+class WatchManifest:
+    """Files already processed in watch mode, by path, size, mtime and content hash"""
+    
+    def __init__(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                              "mtime_ns INTEGER, content_hash TEXT, processed_at REAL)")
+    
+    def is_new(self, path, stat):
+        """True unless path was processed with this size and mtime"""
+        row = self.conn.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (str(path),)).fetchone()
+        return row is None or tuple(row) != (stat.st_size, stat.st_mtime_ns)
+    
+    def record(self, path, stat, content_hash):
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                          (str(path), stat.st_size, stat.st_mtime_ns, content_hash, time.time()))
+    
+    def flush(self):
+        self.conn.commit()
+    
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+class _ArrivalHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+    
+    def on_created(self, event):
+        self.watcher.notify(event.src_path)
+    
+    def on_modified(self, event):
+        self.watcher.notify(event.src_path)
+    
+    def on_moved(self, event):
+        self.watcher.notify(event.dest_path)
+
+class DirectoryWatcher:
+    """Candidate image paths under one or more roots.
+
+    With watchdog, inotify (or the platform equivalent) reports arrivals as they
+    happen; without it every root is rescanned on each poll. Either way the roots
+    are scanned once at start so files that arrived while nothing was watching are
+    picked up; the manifest decides what is actually new.
+    """
+    
+    def __init__(self, roots, interval=WATCH_POLL_INTERVAL, use_watchdog=WATCHDOG_AVAILABLE,
+                 recursive=RECURSIVE_SCAN, include=(), exclude=(), shard=None):
+        self.roots = [Path(root) for root in roots]
+        self.interval = interval
+        self.scan_options = {'recursive': recursive, 'include': include, 'exclude': exclude, 'shard': shard}
+        self.changed = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.observer = None
+        if use_watchdog:
+            self.observer = Observer()
+            handler = _ArrivalHandler(self)
+            for root in self.roots:
+                self.observer.schedule(handler, str(root), recursive=recursive)
+            self.observer.start()
+            logger.info("Watching %d directories with %s", len(self.roots), type(self.observer).__name__)
+        else:
+            logger.info("Polling %d directories every %.1fs (watchdog not in use)", len(self.roots), interval)
+        self._scan_pending = True
+    
+    def notify(self, path):
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS and self._selected(Path(path)):
+            with self.lock:
+                self.changed.add(Path(path))
+            self.wakeup.set()
+    
+    def _selected(self, path):
+        for root in self.roots:
+            try:
+                rel_path = path.relative_to(root).as_posix()
+            except ValueError:
+                continue
+            if not self.scan_options['recursive'] and '/' in rel_path:
+                return False
+            return path_selected(rel_path, self.scan_options['include'], self.scan_options['exclude'],
+                                 self.scan_options['shard'])
+        return False
+    
+    def poll(self, timeout=None):
+        """Wait up to timeout (default: the poll interval) and return the paths seen since the last call"""
+        timeout = self.interval if timeout is None else timeout
+        if self.observer is None or self._scan_pending:
+            if not self._scan_pending:
+                time.sleep(timeout)
+            self._scan_pending = False
+            found = set(iter_image_files(self.roots, **self.scan_options))
+            with self.lock:
+                self.changed |= found
+        else:
+            self.wakeup.wait(timeout)
+        self.wakeup.clear()
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        return changed
+    
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
 def get_input_directory():
     """Prompt user for input directory"""
     print("\n" + "=" * 60)
@@ -527,29 +2509,87 @@ def get_input_directory():
             print(f"Error: '{user_input}' is not a directory.\n")
             continue
             
-        # Check if directory contains any image files
-        image_count = 0
-        for ext in IMAGE_EXTENSIONS:
-            image_count += len(list(input_path.glob(f"*{ext}")))
-            image_count += len(list(input_path.glob(f"*{ext.upper()}")))
-        
-        if image_count == 0:
+        # Check if directory contains any image files; stops at the first one instead
+        # of walking a large tree just to print a count
+        if next(iter_image_files([input_path]), None) is None:
             print(f"Warning: No image files found in '{user_input}'.")
             proceed = input("Do you want to proceed anyway? (yes/no): ").strip().lower()
             if proceed not in ['yes', 'y']:
                 continue
         else:
-            print(f"\nFound {image_count} image file(s) in directory.")
+            print("\nImage files found in directory; they are counted as they are processed.")
         
         return input_path
 
 def main():
+    parser = argparse.ArgumentParser(description="Filter and classify images and update the catalog CSV")
+    parser.add_argument('roots', nargs='*', metavar='DIR',
+                        help="directories to process (prompted for when none are given)")
+    parser.add_argument('--no-recursive', dest='recursive', action='store_false',
+                        help="only look at files directly inside each directory")
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                        help="only process paths (relative to their directory) matching this glob; repeatable")
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                        help="skip paths and subdirectories matching this glob; repeatable")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="process only shard I (0-based) of N, for splitting a run across parallel jobs")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and process new images as they arrive in the directories")
+    parser.add_argument('--interval', type=float, default=WATCH_POLL_INTERVAL,
+                        help="watch mode poll interval in seconds")
+    parser.add_argument('--workers', type=int, default=PROCESS_WORKERS, help="processor worker processes")
+    parser.add_argument('--redecide', action='store_true',
+                        help="re-apply the classification rules to stored model outputs instead of processing images")
+    parser.add_argument('--min-confidence', type=float, default=MIN_CLASSIFICATION_CONFIDENCE,
+                        help="confidence threshold for --redecide")
+    parser.add_argument('--train-prefilter', action='store_true',
+                        help="fit the stage-0 prefilter to the pipeline's decisions on the directories")
+    parser.add_argument('--recall-target', type=float, default=PREFILTER_RECALL_TARGET,
+                        help="share of approved images the prefilter must pass")
+    parser.add_argument('--no-prefilter', dest='prefilter', action='store_false',
+                        help="run every image through the full pipeline even if a prefilter is trained")
+    args = parser.parse_args()
+    if not 0.0 < args.recall_target <= 1.0:
+        parser.error("--recall-target must be in (0, 1]")
+    
+    if args.redecide:
+        redecide(args.min_confidence)
+        return
+    
     logger.info("Starting Processor - Image Validator and Catalog Builder")
     
     if not MODEL_PATH.exists():
         logger.error("Model not found at %s", MODEL_PATH)
         sys.exit(1)
     
+    missing = [root for root in args.roots if not Path(root).is_dir()]
+    if missing:
+        logger.error("Not a directory: %s", ', '.join(missing))
+        sys.exit(1)
+    scan_options = {'recursive': args.recursive, 'include': args.include,
+                    'exclude': args.exclude, 'shard': args.shard}
+    prefilter_options = {'prefilter': args.prefilter, 'recall_target': args.recall_target}
+    
+    if args.train_prefilter:
+        if not args.roots:
+            parser.error("--train-prefilter needs at least one directory")
+        train_prefilter(iter_image_files(args.roots, **scan_options), args.recall_target, args.workers)
+        return
+    
+    if args.watch:
+        if not args.roots:
+            parser.error("--watch needs at least one directory")
+        logger.info("Watch mode: %s", ', '.join(args.roots))
+        ImageProcessor(workers=args.workers, **prefilter_options).watch(args.roots, args.interval, **scan_options)
+        return
+    
+    if args.roots:
+        logger.info("Processing images from: %s", ', '.join(args.roots))
+        processor = ImageProcessor(workers=args.workers, **prefilter_options)
+        processor.process_images(iter_image_files(args.roots, **scan_options))
+        logger.info("Processor completed successfully")
+        return
+    
     # Get input directory from user
     input_directory = get_input_directory()
     
@@ -558,10 +2598,10 @@ def main():
     print(f"CSV catalog: {CSV_PATH}")
     print("\nStarting processing...\n")
     
-    processor = ImageProcessor(input_directory)
-    processor.process_images()
+    processor = ImageProcessor(input_directory, workers=args.workers, **prefilter_options)
+    processor.process_images(iter_image_files([input_directory], **scan_options))
     
     logger.info("Processor completed successfully")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Processor Benchmarks - Measures the 03processor.py stages on a folder of images
+
+Usage:
+    python benchmark-processor.py batch <image_dir> [--batch-sizes 1 4 8 16 32]
+    python benchmark-processor.py colors <image_dir> [--engines kmeans minibatch median_cut histogram]
+    python benchmark-processor.py body <image_dir> [--modes separate shared_pyramid]
+    python benchmark-processor.py text <image_dir> [--max-sides 800 1200 1600] [--calibrate]
+    python benchmark-processor.py decode <image_dir>
+"""
+
+import sys
+import logging
+import argparse
+import importlib.util
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+PROCESSOR_SCRIPT = SCRIPT_DIR / "03processor.py"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+def load_processor_module():
+    """Import 03processor.py, which cannot be imported by name because of its numeric prefix"""
+    spec = importlib.util.spec_from_file_location("processor", PROCESSOR_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def find_images(processor, directory, limit):
+    image_files = sorted(
+        path for path in Path(directory).iterdir()
+        if path.is_file() and path.suffix.lower() in processor.IMAGE_EXTENSIONS
+    )
+    return image_files[:limit] if limit else image_files
+
+def benchmark_batch_sizes(processor, image_paths, batch_sizes):
+    """Report classifier images/sec for each batch size"""
+    classifier = processor.ClothingClassifier(processor.MODEL_PATH)
+    # Per-image decision logging would dominate the timings
+    processor.logger.setLevel(logging.WARNING)
+
+    # Warm-up so the first measurement does not pay for allocator and thread start-up
+    classifier.classify_batch(image_paths[:max(batch_sizes)], batch_size=max(batch_sizes))
+
+    logger.info("%10s | %22s | %18s", "batch size", "end-to-end images/sec", "model images/sec")
+    for batch_size in batch_sizes:
+        classifier.images_classified = 0
+        classifier.inference_seconds = 0.0
+        started = time.perf_counter()
+        classifier.classify_batch(image_paths, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        logger.info("%10d | %22.1f | %18.1f", batch_size, len(image_paths) / elapsed, classifier.images_per_second())
+
+def benchmark_color_engines(processor, image_paths, engines, n_colors=3):
+    """Report ms/image for each dominant color engine and how often it agrees with 'kmeans'"""
+    processor.logger.setLevel(logging.WARNING)
+    contexts = [processor.ImageContext(path) for path in image_paths]
+    # Decode and resize up front so only the engines are timed
+    contexts = [ctx for ctx in contexts if ctx.rgb_150 is not None]
+    detector = processor.ColorDetector
+
+    reference = [detector.get_dominant_colors(ctx, n_colors, 'kmeans') for ctx in contexts]
+    logger.info("%12s | %16s | %14s | %13s | %16s", "engine", "per-image ms/img", "batched ms/img",
+                "same colors %", "mean name overlap")
+    for engine in engines:
+        started = time.perf_counter()
+        for ctx in contexts:
+            detector.get_dominant_colors(ctx, n_colors, engine)
+        per_image = (time.perf_counter() - started) / len(contexts)
+
+        # Batched the way the processor calls it: one classifier batch of survivors at a time
+        started = time.perf_counter()
+        names = []
+        for start in range(0, len(contexts), processor.CLASSIFY_BATCH_SIZE):
+            names.extend(detector.get_dominant_colors_batch(contexts[start:start + processor.CLASSIFY_BATCH_SIZE],
+                                                            n_colors, engine))
+        batched = (time.perf_counter() - started) / len(contexts)
+
+        same = sum(set(a) == set(b) for a, b in zip(names, reference)) / len(contexts)
+        overlap = sum(len(set(a) & set(b)) / max(len(set(a) | set(b)), 1)
+                      for a, b in zip(names, reference)) / len(contexts)
+        logger.info("%12s | %16.1f | %14.1f | %13.1f | %16.2f", engine, per_image * 1000, batched * 1000,
+                    same * 100, overlap)
+
+def benchmark_body_modes(processor, image_paths, modes):
+    """Report ms/image and body-rejection agreement with 'separate' for each body detector mode"""
+    processor.logger.setLevel(logging.WARNING)
+    detector = processor.BodyDetector()
+    contexts = [processor.ImageContext(path) for path in image_paths]
+    # Decode and build the 400px views up front so only detection is timed
+    contexts = [ctx for ctx in contexts if ctx.hsv_400 is not None and ctx.gray_400 is not None]
+
+    reference = [detector.has_human_body(ctx, 'separate') for ctx in contexts]
+    logger.info("%d images, %d rejected by 'separate'", len(contexts), sum(reference))
+    logger.info("%15s | %8s | %11s | %8s | %8s", "mode", "ms/img", "agreement %", "extra", "missed")
+    for mode in modes:
+        started = time.perf_counter()
+        decisions = [detector.has_human_body(ctx, mode) for ctx in contexts]
+        elapsed = (time.perf_counter() - started) / len(contexts)
+        agreement = sum(a == b for a, b in zip(decisions, reference)) / len(contexts)
+        extra = sum(a and not b for a, b in zip(decisions, reference))
+        missed = sum(b and not a for a, b in zip(decisions, reference))
+        logger.info("%15s | %8.1f | %11.1f | %8d | %8d", mode, elapsed * 1000, agreement * 100, extra, missed)
+
+def benchmark_text_modes(processor, image_paths, max_sides, calibrate=False):
+    """Report ms/image for the text detector modes and how often 'bounded' agrees with 'full'.
+
+    Timings include decoding, since 'bounded' decodes less. With calibrate, also
+    report the region threshold that maximises agreement for each working size.
+    """
+    processor.logger.setLevel(logging.WARNING)
+    detector = processor.TextDetector()
+    contexts = [processor.ImageContext(path) for path in image_paths]
+    contexts = [ctx for ctx in contexts if ctx.size is not None]
+
+    def timed_counts(mode):
+        for ctx in contexts:
+            ctx.release()
+        started = time.perf_counter()
+        decisions = [detector.has_text(ctx, mode) for ctx in contexts]
+        return decisions, (time.perf_counter() - started) / len(contexts)
+
+    reference, elapsed = timed_counts('full')
+    logger.info("%d images, %d rejected by 'full' (%.1f ms/img)", len(contexts), sum(reference), elapsed * 1000)
+    logger.info("%14s | %9s | %8s | %11s | %20s", "working size", "threshold", "ms/img", "agreement %",
+                "calibrated (agree %)")
+    for max_side in max_sides:
+        processor.TEXT_WORKING_MAX_SIDE = max_side
+        decisions, elapsed = timed_counts('bounded')
+        agreement = sum(a == b for a, b in zip(decisions, reference)) / len(contexts)
+        calibrated = ''
+        if calibrate:
+            # Region counts at this working size, against every candidate threshold
+            counts = []
+            for ctx in contexts:
+                factor = detector.working_reduction(ctx, max_side)
+                gray = ctx.gray_reduced(factor)
+                counts.append(0 if gray is None else detector.count_text_regions(gray, 1.0 / factor))
+            scores = {threshold: sum((count > threshold) == rejected for count, rejected in zip(counts, reference))
+                      for threshold in range(1, 4 * processor.TEXT_REGION_THRESHOLD)}
+            best = max(scores, key=scores.get)
+            calibrated = "%d (%.1f)" % (best, scores[best] / len(contexts) * 100)
+        logger.info("%14d | %9d | %8.1f | %11.1f | %20s", max_side, processor.TEXT_BOUNDED_REGION_THRESHOLD,
+                    elapsed * 1000, agreement * 100, calibrated)
+
+def benchmark_classifier_decode(processor, image_paths):
+    """Report classifier input ms/image and decision agreement with and without REDUCED_DECODE_CLASSIFIER"""
+    classifier = processor.ClothingClassifier(processor.MODEL_PATH)
+    processor.logger.setLevel(logging.WARNING)
+
+    def run(reduced):
+        processor.REDUCED_DECODE_CLASSIFIER = reduced
+        # Fresh contexts so neither run reuses the other's cached tensor
+        contexts = [processor.ImageContext(path) for path in image_paths]
+        started = time.perf_counter()
+        for ctx in contexts:
+            classifier._load_tensor(ctx)
+        decode = (time.perf_counter() - started) / len(contexts)
+        return classifier.classify_batch(contexts), decode
+
+    reference, reference_decode = run(False)
+    logger.info("%8s | %14s | %11s | %8s | %21s", "decode", "input ms/img", "agreement %", "changed",
+                "mean confidence diff")
+    logger.info("%8s | %14.1f | %11s | %8s | %21s", "full", reference_decode * 1000, "-", "-", "-")
+    results, decode = run(True)
+    agreement = sum(a[0] == b[0] for a, b in zip(results, reference)) / len(image_paths)
+    changed = sum(a[1] != b[1] for a, b in zip(results, reference))
+    confidence_diff = sum(abs(a[2] - b[2]) for a, b in zip(results, reference)) / len(image_paths)
+    logger.info("%8s | %14.1f | %11.1f | %8d | %21.3f", "reduced", decode * 1000, agreement * 100, changed,
+                confidence_diff)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark 03processor.py stages")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help="classifier throughput against batch size")
+    batch_parser.add_argument('image_dir')
+    batch_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    batch_parser.add_argument('--limit', type=int, default=256, help="maximum number of images to use")
+
+    colors_parser = subparsers.add_parser('colors', help="dominant color engines: speed and agreement with kmeans")
+    colors_parser.add_argument('image_dir')
+    colors_parser.add_argument('--engines', nargs='+', default=['kmeans', 'minibatch', 'median_cut', 'histogram'])
+    colors_parser.add_argument('--limit', type=int, default=256, help="maximum number of images to use")
+
+    body_parser = subparsers.add_parser('body', help="body detector modes: speed and agreement with 'separate'")
+    body_parser.add_argument('image_dir')
+    body_parser.add_argument('--modes', nargs='+', default=['separate', 'shared_pyramid'])
+    body_parser.add_argument('--limit', type=int, default=256, help="maximum number of images to use")
+
+    text_parser = subparsers.add_parser('text', help="text detector modes: speed, agreement with 'full', calibration")
+    text_parser.add_argument('image_dir')
+    text_parser.add_argument('--max-sides', type=int, nargs='+', default=[800, 1200, 1600],
+                             help="TEXT_WORKING_MAX_SIDE values to try")
+    text_parser.add_argument('--calibrate', action='store_true',
+                             help="find the region threshold that best matches 'full' at each working size")
+    text_parser.add_argument('--limit', type=int, default=256, help="maximum number of images to use")
+
+    decode_parser = subparsers.add_parser('decode', help="classifier input: full decode against DCT-reduced decode")
+    decode_parser.add_argument('image_dir')
+    decode_parser.add_argument('--limit', type=int, default=256, help="maximum number of images to use")
+
+    args = parser.parse_args()
+    processor = load_processor_module()
+
+    image_paths = find_images(processor, args.image_dir, args.limit)
+    if not image_paths:
+        logger.error("No images found in %s", args.image_dir)
+        sys.exit(1)
+    logger.info("Benchmarking with %d images", len(image_paths))
+
+    if args.command == 'batch':
+        if not processor.MODEL_PATH.exists():
+            logger.error("Model not found at %s", processor.MODEL_PATH)
+            sys.exit(1)
+        benchmark_batch_sizes(processor, image_paths, args.batch_sizes)
+    elif args.command == 'colors':
+        unknown = set(args.engines) - set(processor.DOMINANT_COLOR_ENGINES)
+        if unknown:
+            logger.error("Unknown engines: %s", ', '.join(sorted(unknown)))
+            sys.exit(1)
+        benchmark_color_engines(processor, image_paths, args.engines)
+    elif args.command == 'body':
+        benchmark_body_modes(processor, image_paths, args.modes)
+    elif args.command == 'text':
+        benchmark_text_modes(processor, image_paths, args.max_sides, args.calibrate)
+    elif args.command == 'decode':
+        if not processor.MODEL_PATH.exists():
+            logger.error("Model not found at %s", processor.MODEL_PATH)
+            sys.exit(1)
+        benchmark_classifier_decode(processor, image_paths)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Model Export - Writes TorchScript, ONNX and INT8 versions of best_model.pth and benchmarks them
+
+The processor and the API servers pick a backend with INFERENCE_BACKEND
+(eager, torchscript, onnx or int8); the exported files sit next to the .pth file.
+
+Usage:
+    python export-model.py export [--model best_model.pth] [--images <dir>]
+    python export-model.py quantize [--model best_model.pth] [--images catalog-data/images]
+    python export-model.py benchmark [--model best_model.pth] [--batch-size 16]
+"""
+
+import sys
+import logging
+import argparse
+import copy
+import importlib.util
+import random
+import statistics
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+PROCESSOR_SCRIPT = SCRIPT_DIR / "03processor.py"
+
+# Parity gate: an exported model is kept only if it matches eager PyTorch this closely
+PARITY_MIN_TOP1_AGREEMENT = 0.99
+PARITY_MAX_PROB_DIFF = 1e-3
+ONNX_OPSET = 17
+
+# INT8 static quantization: calibration and held-out evaluation samples are drawn
+# from the catalog images; the quantized model is written only if it passes the gate
+QUANT_ENGINE = 'x86'
+QUANT_CALIBRATION_IMAGES = 256
+QUANT_EVALUATION_IMAGES = 256
+QUANT_MIN_TOP1_AGREEMENT = 0.98
+QUANT_MAX_DECISION_RATE_DIFF = 0.02
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+def load_processor_module():
+    """Import 03processor.py, which cannot be imported by name because of its numeric prefix"""
+    spec = importlib.util.spec_from_file_location("processor", PROCESSOR_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build_transform(processor):
+    transforms = processor.transforms
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ])
+
+def find_images(processor, image_dir):
+    return sorted(path for path in Path(image_dir).iterdir()
+                  if path.suffix.lower() in processor.IMAGE_EXTENSIONS)
+
+def image_tensors(processor, paths):
+    """Stack the transformed images that decode; None if none do"""
+    transform = build_transform(processor)
+    tensors = []
+    for path in paths:
+        try:
+            with processor.Image.open(path) as img:
+                tensors.append(transform(img.convert('RGB')))
+        except Exception as e:
+            logger.warning("Skipping %s: %s", path, e)
+    return processor.torch.stack(tensors) if tensors else None
+
+def sample_inputs(processor, image_dir, limit):
+    """A batch of transformed images from image_dir, or random tensors when there are none"""
+    torch = processor.torch
+    if image_dir:
+        inputs = image_tensors(processor, find_images(processor, image_dir)[:limit])
+        if inputs is not None:
+            return inputs
+        logger.warning("No usable images in %s; using random inputs", image_dir)
+    return torch.randn(limit, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+
+def probabilities(processor, model, inputs, batch_size=16):
+    torch = processor.torch
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(inputs), batch_size):
+            outputs.append(torch.softmax(model(inputs[start:start + batch_size]), dim=1))
+    return torch.cat(outputs)
+
+def compare_predictions(processor, reference, candidate):
+    """Agreement metrics between two sets of class probabilities"""
+    threshold = processor.MIN_CLASSIFICATION_CONFIDENCE
+    reference_accepts = reference.max(dim=1).values >= threshold
+    candidate_accepts = candidate.max(dim=1).values >= threshold
+    return {
+        'top1_agreement': (reference.argmax(dim=1) == candidate.argmax(dim=1)).float().mean().item(),
+        'max_prob_diff': (reference - candidate).abs().max().item(),
+        'decision_agreement': (reference_accepts == candidate_accepts).float().mean().item(),
+        'reference_decision_rate': reference_accepts.float().mean().item(),
+        'candidate_decision_rate': candidate_accepts.float().mean().item(),
+    }
+
+def check_parity(processor, reference, candidate):
+    """Compare a backend's probabilities with eager PyTorch; returns (passed, report)"""
+    metrics = compare_predictions(processor, reference, candidate)
+    passed = (metrics['top1_agreement'] >= PARITY_MIN_TOP1_AGREEMENT and
+              metrics['max_prob_diff'] <= PARITY_MAX_PROB_DIFF)
+    report = "top-1 agreement %.2f%%, max prob diff %.2e, decision agreement %.2f%%" % (
+        metrics['top1_agreement'] * 100, metrics['max_prob_diff'], metrics['decision_agreement'] * 100)
+    return passed, report
+
+def export_models(processor, model_path, image_dir, limit):
+    torch = processor.torch
+    eager, _ = processor.load_model(model_path, 'eager')
+    example = torch.randn(1, 3, 224, 224)
+    exported = processor.exported_model_paths(model_path)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(eager, example)
+        frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, str(exported['torchscript']))
+    logger.info("Wrote %s", exported['torchscript'])
+
+    try:
+        torch.onnx.export(
+            eager, example, str(exported['onnx']),
+            input_names=['input'], output_names=['logits'],
+            dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+            opset_version=ONNX_OPSET,
+        )
+        logger.info("Wrote %s", exported['onnx'])
+    except Exception as e:
+        logger.error("ONNX export failed: %s", e)
+
+    inputs = sample_inputs(processor, image_dir, limit)
+    reference = probabilities(processor, eager, inputs)
+    failed = False
+    for backend in ('torchscript', 'onnx'):
+        path = exported[backend]
+        if not path.exists():
+            continue
+        model, loaded = processor.load_model(model_path, backend)
+        if loaded != backend:
+            logger.warning("%s: could not be loaded for the parity check", backend)
+            continue
+        passed, report = check_parity(processor, reference, probabilities(processor, model, inputs))
+        logger.info("%-11s | %s | %s", backend, report, "OK" if passed else "FAILED")
+        if not passed:
+            # Remove it so that INFERENCE_BACKEND falls back to eager instead of using it
+            for stale in (path, path.with_name(path.name + '.data')):
+                if stale.exists():
+                    stale.unlink()
+            failed = True
+    return not failed
+
+def quantize_model(processor, model_path, image_dir, calibration_count, evaluation_count):
+    """Post-training static INT8 quantization, gated on agreement with the fp32 model.
+
+    Returns True if the quantized model was written.
+    """
+    torch = processor.torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    paths = find_images(processor, image_dir)
+    random.Random(0).shuffle(paths)
+    calibration = image_tensors(processor, paths[:calibration_count])
+    evaluation = image_tensors(processor, paths[calibration_count:calibration_count + evaluation_count])
+    if calibration is None or evaluation is None:
+        logger.error("Need images in %s for both calibration and evaluation (found %d)", image_dir, len(paths))
+        return False
+    logger.info("Calibrating on %d images, evaluating on %d held-out images", len(calibration), len(evaluation))
+
+    eager, _ = processor.load_model(model_path, 'eager')
+    example = torch.randn(1, 3, 224, 224)
+    torch.backends.quantized.engine = QUANT_ENGINE
+    prepared = prepare_fx(copy.deepcopy(eager), get_default_qconfig_mapping(QUANT_ENGINE), example_inputs=(example,))
+    probabilities(processor, prepared, calibration)  # observers record activation ranges
+    quantized = convert_fx(prepared)
+
+    metrics = compare_predictions(processor, probabilities(processor, eager, evaluation),
+                                  probabilities(processor, quantized, evaluation))
+    decision_rate_diff = abs(metrics['candidate_decision_rate'] - metrics['reference_decision_rate'])
+    logger.info("INT8 vs fp32: top-1 agreement %.2f%% (min %.2f%%), decision rate %.2f%% vs %.2f%% (max diff %.2f%%)",
+                metrics['top1_agreement'] * 100, QUANT_MIN_TOP1_AGREEMENT * 100,
+                metrics['candidate_decision_rate'] * 100, metrics['reference_decision_rate'] * 100,
+                QUANT_MAX_DECISION_RATE_DIFF * 100)
+
+    int8_path = processor.exported_model_paths(model_path)['int8']
+    if metrics['top1_agreement'] < QUANT_MIN_TOP1_AGREEMENT or decision_rate_diff > QUANT_MAX_DECISION_RATE_DIFF:
+        if int8_path.exists():
+            int8_path.unlink()  # an older export no longer matches this model
+        return False
+
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(quantized, example))
+    torch.jit.save(frozen, str(int8_path))
+    logger.info("Wrote %s (%.1f MB vs %.1f MB fp32)", int8_path,
+                int8_path.stat().st_size / 1e6, Path(model_path).stat().st_size / 1e6)
+    return True
+
+def benchmark_backends(processor, model_path, batch_size, iterations):
+    """Single-image latency and batched throughput for every backend that loads"""
+    torch = processor.torch
+    single = torch.randn(1, 3, 224, 224)
+    batch = torch.randn(batch_size, 3, 224, 224)
+    logger.info("%11s | %18s | %18s", "backend", "latency ms (p50)", "images/sec")
+    for backend in ('eager', 'torchscript', 'onnx', 'int8'):
+        model, loaded = processor.load_model(model_path, backend)
+        if loaded != backend:
+            continue
+        with torch.no_grad():
+            for _ in range(3):
+                model(single)
+                model(batch)
+            latencies = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                model(single)
+                latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            for _ in range(max(1, iterations // 4)):
+                model(batch)
+            throughput = max(1, iterations // 4) * batch_size / (time.perf_counter() - started)
+        logger.info("%11s | %18.1f | %18.1f", backend, statistics.median(latencies) * 1000, throughput)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and benchmark classifier inference backends")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="write TorchScript and ONNX models and check parity")
+    export_parser.add_argument('--images', help="images for the parity check (random inputs if omitted)")
+    export_parser.add_argument('--limit', type=int, default=64, help="number of parity-check inputs")
+
+    quantize_parser = subparsers.add_parser('quantize', help="calibrated INT8 model, kept only if it passes the accuracy gate")
+    quantize_parser.add_argument('--images', type=Path, default=None,
+                                 help="calibration/evaluation images (default: catalog-data/images)")
+    quantize_parser.add_argument('--calibration-images', type=int, default=QUANT_CALIBRATION_IMAGES)
+    quantize_parser.add_argument('--evaluation-images', type=int, default=QUANT_EVALUATION_IMAGES)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="CPU latency and throughput per backend")
+    benchmark_parser.add_argument('--batch-size', type=int, default=16)
+    benchmark_parser.add_argument('--iterations', type=int, default=20)
+
+    for subparser in (export_parser, quantize_parser, benchmark_parser):
+        subparser.add_argument('--model', type=Path, default=None, help="path to best_model.pth")
+
+    args = parser.parse_args()
+    processor = load_processor_module()
+    model_path = args.model or processor.MODEL_PATH
+    if not model_path.exists():
+        logger.error("Model not found at %s", model_path)
+        sys.exit(1)
+
+    if args.command == 'export':
+        if not export_models(processor, model_path, args.images, args.limit):
+            logger.error("Parity check failed; the failing exports were removed")
+            sys.exit(1)
+    elif args.command == 'quantize':
+        image_dir = args.images or processor.FINAL_IMAGE_DIR
+        if not quantize_model(processor, model_path, image_dir, args.calibration_images, args.evaluation_images):
+            logger.error("INT8 model was not written")
+            sys.exit(1)
+    elif args.command == 'benchmark':
+        benchmark_backends(processor, model_path, args.batch_size, args.iterations)
+
+if __name__ == '__main__':
+    main()
@@ -71,18 +71,30 @@ setup_virtual_environment()
 # --------------------
 import csv
 import time
+import bisect
 import hashlib
+import heapq
+import mmap
 import re
 import gc
+import itertools
 import shutil
 from urllib.parse import urljoin, urlparse, parse_qs, urlunparse
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from queue import Queue, Empty
+from collections import deque
+from contextlib import contextmanager
 import threading
 
 import requests
 from bs4 import BeautifulSoup
+
+# fcntl is POSIX-only; without it the hash store is only locked within a process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 import cv2
 import numpy as np
 from PIL import Image
@@ -114,7 +126,7 @@ except Exception as e:
     sys.exit(1)
 
 # scikit-learn
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 
 # Mediapipe optional
 try:
@@ -186,6 +198,17 @@ COLOR_NAMES = {
     'magenta': (255, 0, 255),
 }
 
+# Color naming: RGB values are mapped to COLOR_NAMES through a precomputed table
+# with COLOR_LUT_BITS bits per channel (6 -> 64^3 cells, 256 KB)
+COLOR_LUT_BITS = 6
+
+# Dominant color engine: 'kmeans' (10 restarts, the reference), 'minibatch'
+# (one k-means++ start on mini-batches), 'median_cut', or 'histogram'
+# (coarse RGB histogram, vectorised across a whole batch of images)
+DOMINANT_COLOR_ENGINE = 'kmeans'
+MINIBATCH_KMEANS_BATCH = 2048
+COLOR_HISTOGRAM_BITS = 4
+
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
 MIN_IMAGE_SIZE = 100
 MAX_IMAGE_SIZE = 2000
@@ -194,13 +217,28 @@ USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTM
 # STRICTER confidence threshold
 MIN_CLASSIFICATION_CONFIDENCE = 0.76  # Increased from 0.3
 
+# Batched inference: images per forward pass and decode/transform threads
+CLASSIFY_BATCH_SIZE = 16
+PREFETCH_WORKERS = 4
+
+# Inference service: requests from the download/filter threads are grouped into
+# micro-batches of up to CLASSIFY_BATCH_SIZE, waiting at most this long to fill one
+INFERENCE_MAX_WAIT = 0.02
+
 MAX_PAGES_PER_DOMAIN = 10
 MAX_DEPTH = 9
 CRAWL_DELAY = 1.0
 MAX_WORKERS = 9
 IGNORE_ROBOTS_TXT = True
 
-DOWNLOADED_IMAGES_FILE = PROJECT_ROOT / "catalog-data" / ".downloaded_hashes.txt"
+DOWNLOADED_IMAGES_FILE = PROJECT_ROOT / "catalog-data" / ".downloaded_hashes.bin"
+DOWNLOADED_IMAGES_LOG = PROJECT_ROOT / "catalog-data" / ".downloaded_hashes.log"
+LEGACY_DOWNLOADED_IMAGES_FILE = PROJECT_ROOT / "catalog-data" / ".downloaded_hashes.txt"
+
+# Downloaded hash store: appends are batched, and the log is folded into the
+# sorted base file once it reaches the compaction threshold
+HASH_STORE_FLUSH_EVERY = 64
+HASH_STORE_COMPACT_THRESHOLD = 4096
 
 TRACKING_PARAMS = {
     'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
@@ -217,7 +255,7 @@ logger.warning("STRICT MODE: Only valid clothing items will be saved. No body pa
 # CLASSIFIER WITH STRICT VALIDATION
 # --------------------
 class ClothingClassifier:
-    def __init__(self, model_path):
+    def __init__(self, model_path, batch_size=CLASSIFY_BATCH_SIZE, prefetch_workers=PREFETCH_WORKERS):
         logger.info("Loading model from %s...", model_path)
         self.model = models.resnet50(pretrained=False)
         num_ftrs = self.model.fc.in_features
@@ -246,37 +284,184 @@ class ClothingClassifier:
             )
         ])
 
-    def classify(self, image_path):
-        """Classify image and STRICTLY validate category."""
+        # Decoding and transforms run on worker threads, ahead of the batch being inferred
+        self.batch_size = batch_size
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='classify-prefetch')
+        self.images_classified = 0
+        self.inference_seconds = 0.0
+
+    def _load_tensor(self, image_path):
+        """Decode and transform one image; runs on the prefetch threads."""
         try:
-            img = Image.open(image_path).convert('RGB')
-            input_tensor = self.transform(img).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                output = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(output, dim=1)
-                confidence, predicted_idx = torch.max(probabilities, dim=1)
+            with Image.open(image_path) as img:
+                return self.transform(img.convert('RGB'))
+        except Exception as e:
+            logger.warning("Could not load %s for classification: %s", image_path, e)
+            return None
+
+    def _prefetch(self, image_paths, batch_size):
+        """Yield transformed tensors in order, decoding up to two batches ahead."""
+        paths = iter(image_paths)
+        pending = deque(
+            self.prefetch_pool.submit(self._load_tensor, path)
+            for path in itertools.islice(paths, 2 * batch_size)
+        )
+        while pending:
+            future = pending.popleft()
+            for path in itertools.islice(paths, 1):
+                pending.append(self.prefetch_pool.submit(self._load_tensor, path))
+            yield future.result()
+
+    def _decide(self, clothing_type, confidence_val):
+        """Validate a prediction against the rejection rules."""
+        # STRICT VALIDATION: Reject uncertain or invalid categories
+        if clothing_type in REJECTED_CATEGORIES:
+            logger.info("REJECTED: Invalid category '%s'", clothing_type)
+            return "REJECTED", "rejected", 0.0
             
-            clothing_type = CATEGORY_NAMES[predicted_idx.item()]
-            confidence_val = confidence.item()
+        if confidence_val < MIN_CLASSIFICATION_CONFIDENCE:
+            logger.info("REJECTED: Low confidence %.2f for '%s'", confidence_val, clothing_type)
+            return "REJECTED", "rejected", 0.0
             
-            # STRICT VALIDATION: Reject uncertain or invalid categories
-            if clothing_type in REJECTED_CATEGORIES:
-                logger.info("REJECTED: Invalid category '%s'", clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            if confidence_val < MIN_CLASSIFICATION_CONFIDENCE:
-                logger.info("REJECTED: Low confidence %.2f for '%s'", confidence_val, clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            category = CLOTHING_CATEGORIES.get(clothing_type, 'uncategorized')
-            if category == 'uncategorized':
-                logger.info("REJECTED: Uncategorized clothing type '%s'", clothing_type)
-                return "REJECTED", "rejected", 0.0
-                
-            return clothing_type, category, confidence_val
-        except Exception as e:
-            logger.exception("Classification error: %s", e)
+        category = CLOTHING_CATEGORIES.get(clothing_type, 'uncategorized')
+        if category == 'uncategorized':
+            logger.info("REJECTED: Uncategorized clothing type '%s'", clothing_type)
             return "REJECTED", "rejected", 0.0
+            
+        return clothing_type, category, confidence_val
+
+    def _run_batch(self, tensors):
+        """Forward one batch and return (clothing_type, confidence) per image."""
+        started = time.perf_counter()
+        batch = torch.stack(tensors).to(self.device)
+        with torch.no_grad():
+            output = self.model(batch)
+            probabilities = torch.nn.functional.softmax(output, dim=1)
+            confidences, predicted_idx = torch.max(probabilities, dim=1)
+        self.inference_seconds += time.perf_counter() - started
+        self.images_classified += len(tensors)
+        return [(CATEGORY_NAMES[idx], conf) for idx, conf in zip(predicted_idx.tolist(), confidences.tolist())]
+
+    def classify(self, image_path):
+        """Classify image and STRICTLY validate category."""
+        return self.classify_batch([image_path])[0]
+
+    def classify_batch(self, image_paths, batch_size=None):
+        """Classify several images with batched forward passes.
+
+        Returns one (clothing_type, category, confidence) tuple per path, in order.
+        """
+        batch_size = batch_size or self.batch_size
+        results = [("REJECTED", "rejected", 0.0)] * len(image_paths)
+        indices, tensors = [], []
+        
+        def flush():
+            try:
+                for index, (clothing_type, confidence_val) in zip(indices, self._run_batch(tensors)):
+                    results[index] = self._decide(clothing_type, confidence_val)
+            except Exception as e:
+                logger.exception("Classification error: %s", e)
+            indices.clear()
+            tensors.clear()
+        
+        for index, tensor in enumerate(self._prefetch(image_paths, batch_size)):
+            if tensor is None:
+                continue
+            indices.append(index)
+            tensors.append(tensor)
+            if len(tensors) >= batch_size:
+                flush()
+        if tensors:
+            flush()
+        return results
+
+    def images_per_second(self):
+        if self.inference_seconds <= 0:
+            return 0.0
+        return self.images_classified / self.inference_seconds
+
+class InferenceService:
+    """Runs every classification on one thread, in micro-batches.
+
+    Callers decode and transform on their own thread, then wait on a Future while
+    the service collects requests until the batch is full or INFERENCE_MAX_WAIT
+    has passed since the first one arrived.
+    """
+    def __init__(self, classifier, max_batch=CLASSIFY_BATCH_SIZE, max_wait=INFERENCE_MAX_WAIT):
+        self.classifier = classifier
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = Queue()
+        self.thread = threading.Thread(target=self._run, name='inference', daemon=True)
+        self.batches = 0
+        self.requests_served = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, image_path):
+        """Queue an image for classification; the Future resolves to (clothing_type, category, confidence)"""
+        future = Future()
+        tensor = self.classifier._load_tensor(image_path)
+        if tensor is None:
+            future.set_result(("REJECTED", "rejected", 0.0))
+        else:
+            self.requests.put((tensor, future))
+        return future
+
+    def classify(self, image_path):
+        return self.submit(image_path).result()
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the deadline passes"""
+        first = self.requests.get()
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            tensors = [tensor for tensor, _ in batch]
+            try:
+                predictions = self.classifier._run_batch(tensors)
+                decisions = [self.classifier._decide(clothing_type, confidence_val)
+                             for clothing_type, confidence_val in predictions]
+            except Exception as e:
+                logger.exception("Classification error: %s", e)
+                decisions = [("REJECTED", "rejected", 0.0)] * len(batch)
+            for (_, future), decision in zip(batch, decisions):
+                future.set_result(decision)
+            self.batches += 1
+            self.requests_served += len(batch)
+
+    def close(self):
+        """Finish queued requests and stop the thread"""
+        if self.thread.is_alive():
+            self.requests.put(None)
+            self.thread.join()
+
+    def mean_batch_size(self):
+        if not self.batches:
+            return 0.0
+        return self.requests_served / self.batches
 
 # --------------------
 # ENHANCED BODY DETECTOR - MORE STRICT
@@ -431,9 +616,156 @@ class TextDetector:
 # --------------------
 # REST OF ORIGINAL SCRIPT (with strict validation)
 # --------------------
+class ColorLUT:
+    """Nearest palette name for RGB values, precomputed over a quantised RGB grid.
+
+    Each channel keeps its top `bits` bits and the nearest palette entry is stored
+    per cell, by LAB or plain RGB distance. Cells that straddle a boundary between
+    two palette entries are flagged and their pixels resolved exactly, so lookups
+    give the same answer as a full palette scan. Works on whole pixel arrays.
+    The table takes a second or two to build, so that happens on the first lookup
+    rather than when the module is imported.
+    """
+    def __init__(self, palette, bits=COLOR_LUT_BITS, space='lab'):
+        self.names = list(palette)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.space = space
+        self.palette = self._convert(np.array(list(palette.values())))
+        self.table = None
+        self.ambiguous = None
+        self._build_lock = threading.Lock()
+        
+    def build(self):
+        """Compute the table now (a no-op once built)"""
+        with self._build_lock:
+            if self.table is None:
+                self._build()
+        
+    def _build(self):
+        levels = 1 << self.bits
+        step = 1 << self.shift
+        axis = np.arange(levels)
+        cells = np.stack(np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1).reshape(-1, 3)
+        centres = self._convert(cells * step + step // 2).astype(np.float32)
+        distances = np.sqrt(((centres[:, None, :] - self.palette[None, :, :].astype(np.float32)) ** 2).sum(axis=2))
+        nearest = np.argsort(distances, axis=1, kind='stable')[:, :2]
+        best, second = np.take_along_axis(distances, nearest, axis=1).T
+        table = nearest[:, 0].astype(np.uint8)
+        
+        # Farthest any value in a cell is from its centre. RGB to LAB is not linear, so
+        # the corners do not bound it; every offset within the cell is converted instead
+        radius = np.zeros(len(cells), dtype=np.float32)
+        for offset in itertools.product(range(step), repeat=3):
+            converted = self._convert(cells * step + np.array(offset))
+            radius = np.maximum(radius, np.sqrt(((converted - centres) ** 2).sum(axis=1)))
+        # The small slack covers float32 rounding in the distances above
+        self.ambiguous = second - best <= 2 * radius + 1e-3
+        # Set last: lookups only check the table
+        self.table = table
+        
+    def _convert(self, rgb):
+        rgb = np.asarray(rgb).reshape(-1, 3)
+        if self.space != 'lab':
+            return rgb.astype(np.int64)
+        pixels = rgb.astype(np.uint8).reshape(-1, 1, 3)
+        return cv2.cvtColor(pixels, cv2.COLOR_RGB2LAB).reshape(-1, 3).astype(np.int64)
+        
+    def _distances(self, converted):
+        """Squared distance from each converted pixel to each palette entry"""
+        return ((converted[:, None, :] - self.palette[None, :, :]) ** 2).sum(axis=2)
+        
+    def lookup(self, pixels):
+        """Palette indices for an (..., 3) array of RGB values"""
+        if self.table is None:
+            self.build()
+        pixels = np.clip(np.asarray(pixels), 0, 255).astype(np.int64)
+        q = pixels >> self.shift
+        cells = (q[..., 0] << (2 * self.bits)) | (q[..., 1] << self.bits) | q[..., 2]
+        indices = self.table[cells]
+        ambiguous = self.ambiguous[cells]
+        if ambiguous.any():
+            indices[ambiguous] = self._distances(self._convert(pixels[ambiguous])).argmin(axis=1)
+        return indices
+        
+    def counts(self, pixels):
+        """Number of pixels mapped to each palette entry"""
+        return np.bincount(self.lookup(pixels).ravel(), minlength=len(self.names))
+        
+    def name(self, rgb):
+        return self.names[int(self.lookup(np.asarray(rgb).reshape(1, 3))[0])]
+
+COLOR_LUT = ColorLUT(COLOR_NAMES)
+
+# Each engine takes an (N, 3) RGB pixel array and returns up to n_colors RGB centres
+def _kmeans_colors(pixels, n_colors):
+    kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
+    kmeans.fit(pixels)
+    return kmeans.cluster_centers_
+
+def _minibatch_colors(pixels, n_colors):
+    """Single k-means++ initialisation fitted on mini-batches"""
+    kmeans = MiniBatchKMeans(n_clusters=n_colors, init='k-means++', n_init=1,
+                             batch_size=MINIBATCH_KMEANS_BATCH, random_state=42)
+    kmeans.fit(pixels.astype(np.float32))
+    return kmeans.cluster_centers_
+
+def _median_cut_colors(pixels, n_colors):
+    """Split the box with the widest channel at its median until there are n_colors boxes"""
+    boxes = [pixels]
+    while len(boxes) < n_colors:
+        spans = [np.ptp(box, axis=0).max() if len(box) > 1 else -1 for box in boxes]
+        widest = int(np.argmax(spans))
+        if spans[widest] <= 0:
+            break
+        box = boxes.pop(widest)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind='stable')
+        half = len(box) // 2
+        boxes.extend([box[order[:half]], box[order[half:]]])
+    boxes.sort(key=len, reverse=True)
+    return np.array([box.mean(axis=0) for box in boxes])
+
+def _histogram_colors_batch(pixel_sets, n_colors):
+    """Mean color of the n most populated histogram cells, for many images in one pass"""
+    shift = 8 - COLOR_HISTOGRAM_BITS
+    cells = 1 << (3 * COLOR_HISTOGRAM_BITS)
+    pixels = np.concatenate(pixel_sets).astype(np.int64)
+    offsets = np.repeat(np.arange(len(pixel_sets)) * cells, [len(p) for p in pixel_sets])
+    q = pixels >> shift
+    index = offsets + ((q[:, 0] << (2 * COLOR_HISTOGRAM_BITS)) | (q[:, 1] << COLOR_HISTOGRAM_BITS) | q[:, 2])
+    size = len(pixel_sets) * cells
+    counts = np.bincount(index, minlength=size).reshape(len(pixel_sets), cells)
+    sums = np.stack([np.bincount(index, weights=pixels[:, channel], minlength=size) for channel in range(3)],
+                    axis=-1).reshape(len(pixel_sets), cells, 3)
+    top = np.argsort(-counts, axis=1, kind='stable')[:, :n_colors]
+    centres = []
+    for image_index, image_cells in enumerate(top):
+        image_cells = image_cells[counts[image_index, image_cells] > 0]
+        centres.append(sums[image_index, image_cells] / counts[image_index, image_cells, None])
+    return centres
+
+def _histogram_colors(pixels, n_colors):
+    return _histogram_colors_batch([pixels], n_colors)[0]
+
+DOMINANT_COLOR_ENGINES = {
+    'kmeans': _kmeans_colors,
+    'minibatch': _minibatch_colors,
+    'median_cut': _median_cut_colors,
+    'histogram': _histogram_colors,
+}
+
+def dominant_colors_batch(pixel_sets, n_colors, engine=None):
+    """Dominant RGB centres for several images; the histogram engine handles them in one pass"""
+    engine = engine or DOMINANT_COLOR_ENGINE
+    if engine == 'histogram':
+        return _histogram_colors_batch(pixel_sets, n_colors)
+    return [DOMINANT_COLOR_ENGINES[engine](pixels, n_colors) for pixels in pixel_sets]
+
+
 class ColorDetector:
     @staticmethod
-    def get_dominant_colors(image_path, n_colors=3):
+    def get_dominant_colors(image_path, n_colors=3, engine=None):
         try:
             img = cv2.imread(str(image_path))
             if img is None:
@@ -441,9 +773,7 @@ class ColorDetector:
             img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
             img_small = cv2.resize(img_rgb, (150, 150))
             pixels = img_small.reshape(-1, 3)
-            kmeans = KMeans(n_clusters=n_colors, random_state=42, n_init=10)
-            kmeans.fit(pixels)
-            colors = kmeans.cluster_centers_.astype(int)
+            colors = dominant_colors_batch([pixels], n_colors, engine)[0].astype(int)
             color_names = []
             for color in colors:
                 color_name = ColorDetector._rgb_to_name(tuple(color))
@@ -456,28 +786,196 @@ class ColorDetector:
 
     @staticmethod
     def _rgb_to_name(rgb):
+        return COLOR_LUT.name(rgb)
+
+class _SortedDigestFile:
+    """Read-only, memory-mapped view of a file of sorted fixed-size digests"""
+
+    def __init__(self, path, record_size):
+        self.record_size = record_size
+        self._file = None
+        self._map = None
+        self._count = 0
+        if path.exists() and path.stat().st_size >= record_size:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._count = len(self._map) // record_size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        offset = index * self.record_size
+        return self._map[offset:offset + self.record_size]
+
+    def __contains__(self, digest):
+        index = bisect.bisect_left(self, digest)
+        return index < self._count and self[index] == digest
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._map = None
+        self._file = None
+        self._count = 0
+
+
+class DownloadedHashStore:
+    """Set of URL digests backed by a sorted binary file plus an append log.
+
+    The base file holds raw 16-byte MD5 digests in sorted order and is searched
+    through mmap, so loading it costs nothing however large the archive grows.
+    New digests are kept in memory, appended to the log in batches and merged
+    into the base file once the log passes HASH_STORE_COMPACT_THRESHOLD entries.
+    The downloader and scrape-catalog.py share the files, so appends and
+    compaction also hold an flock on a sibling .lock file.
+    """
+
+    RECORD_SIZE = 16
+
+    def __init__(self, base_path, log_path, legacy_path=None):
+        self.base_path = Path(base_path)
+        self.log_path = Path(log_path)
+        self.lock_path = self.base_path.with_suffix('.lock')
+        self.lock = threading.Lock()
+        self.recent = set()
+        self.pending = []
+        self.log_count = 0
+
+        with self._process_lock():
+            if legacy_path is not None:
+                self._migrate_legacy(Path(legacy_path))
+            self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+            self._load_log()
+
+    @contextmanager
+    def _process_lock(self):
+        """Exclusive across processes using the same store (a no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _migrate_legacy(self, legacy_path):
+        """Import the old one-hex-digest-per-line text file on first use"""
+        if self.base_path.exists() or self.log_path.exists() or not legacy_path.exists():
+            return
+        digests = set()
         try:
-            bgr = np.uint8([[[rgb[2], rgb[1], rgb[0]]]])
-            lab = cv2.cvtColor(bgr, cv2.COLOR_BGR2LAB)[0][0].astype(int)
-            min_dist = float('inf')
-            best_name = None
-            for name, named_rgb in COLOR_NAMES.items():
-                nbgr = np.uint8([[[named_rgb[2], named_rgb[1], named_rgb[0]]]])
-                nlab = cv2.cvtColor(nbgr, cv2.COLOR_BGR2LAB)[0][0].astype(int)
-                dist = np.linalg.norm(lab - nlab)
-                if dist < min_dist:
-                    min_dist = dist
-                    best_name = name
-            return best_name
-        except Exception:
-            min_distance = float('inf')
-            closest_name = None
-            for name, named_rgb in COLOR_NAMES.items():
-                distance = sum((a - b) ** 2 for a, b in zip(rgb, named_rgb)) ** 0.5
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_name = name
-            return closest_name
+            with open(legacy_path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) == self.RECORD_SIZE * 2:
+                        digests.add(bytes.fromhex(line))
+        except (OSError, ValueError) as e:
+            logger.warning("Failed to migrate downloaded hashes file: %s", e)
+            return
+        self._write_base(sorted(digests))
+        logger.info("Migrated %d downloaded hashes from %s", len(digests), legacy_path.name)
+
+    def _load_log(self):
+        if not self.log_path.exists():
+            return
+        with open(self.log_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % self.RECORD_SIZE
+        for offset in range(0, usable, self.RECORD_SIZE):
+            self.recent.add(data[offset:offset + self.RECORD_SIZE])
+        self.log_count = usable // self.RECORD_SIZE
+
+    def _write_base(self, digests):
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.base_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(digests))
+        os.replace(str(tmp_path), str(self.base_path))
+
+    def __contains__(self, image_hash):
+        digest = bytes.fromhex(image_hash)
+        with self.lock:
+            return digest in self.recent or digest in self.base
+
+    def __len__(self):
+        with self.lock:
+            return len(self.base) + len(self.recent)
+
+    def add(self, image_hash):
+        digest = bytes.fromhex(image_hash)
+        with self.lock:
+            if digest in self.recent or digest in self.base:
+                return
+            self.recent.add(digest)
+            self.pending.append(digest)
+            if len(self.pending) >= HASH_STORE_FLUSH_EVERY:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._process_lock():
+            with open(self.log_path, 'ab') as f:
+                f.write(b''.join(self.pending))
+            self.pending = []
+            # Other processes append to the same log
+            self.log_count = self.log_path.stat().st_size // self.RECORD_SIZE
+            if self.log_count >= HASH_STORE_COMPACT_THRESHOLD:
+                self._compact_locked()
+
+    def _compact_locked(self):
+        """Merge the append log into the sorted base file; called with the process lock held.
+
+        The base file and the log are re-read first, since another process may have
+        compacted or appended since this one loaded them.
+        """
+        self.base.close()
+        self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+        self._load_log()
+        self.base_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.base_path.with_suffix('.tmp')
+        count = 0
+        previous = None
+        with open(tmp_path, 'wb') as f:
+            for digest in heapq.merge(self.base, sorted(self.recent)):
+                if digest != previous:
+                    f.write(digest)
+                    count += 1
+                    previous = digest
+        # The map must be released before the file is replaced (Windows)
+        self.base.close()
+        os.replace(str(tmp_path), str(self.base_path))
+        self._safe_unlink(self.log_path)
+        self.base = _SortedDigestFile(self.base_path, self.RECORD_SIZE)
+        self.recent = set()
+        self.log_count = 0
+        logger.debug("Compacted downloaded hashes store: %d entries", count)
+
+    @staticmethod
+    def _safe_unlink(path):
+        try:
+            os.remove(str(path))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self.lock:
+            self._flush_locked()
+            self.base.close()
 
 class WebSpider:
     def __init__(self):
@@ -549,19 +1047,7 @@ class WebSpider:
             self.driver = None
 
     def _load_downloaded_hashes(self):
-        hashes = set()
-        try:
-            if DOWNLOADED_IMAGES_FILE.exists():
-                with open(DOWNLOADED_IMAGES_FILE, 'r') as f:
-                    hashes = set(line.strip() for line in f if line.strip())
-        except Exception:
-            logger.warning("Failed to read downloaded hashes file")
-        return hashes
-
-    def _save_downloaded_hash(self, image_hash):
-        DOWNLOADED_IMAGES_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(DOWNLOADED_IMAGES_FILE, 'a') as f:
-            f.write(f"{image_hash}\n")
+        return DownloadedHashStore(DOWNLOADED_IMAGES_FILE, DOWNLOADED_IMAGES_LOG, LEGACY_DOWNLOADED_IMAGES_FILE)
 
     def _get_image_hash(self, url):
         cleaned_url = self._clean_url(url)
@@ -812,6 +1298,7 @@ class ClothingScraperPipeline:
     def __init__(self):
         OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         self.classifier = ClothingClassifier(MODEL_PATH)
+        self.inference = InferenceService(self.classifier).start()
         self.body_detector = BodyDetector()
         self.text_detector = TextDetector()
         self.color_detector = ColorDetector()
@@ -826,8 +1313,12 @@ class ClothingScraperPipeline:
     def process_urls(self, urls):
         self.stats['total_urls'] = len(urls)
         logger.info("Starting STRICT scraper pipeline | URLs to process: %d", len(urls))
-        for url in urls:
-            self._process_url(url)
+        try:
+            for url in urls:
+                self._process_url(url)
+        finally:
+            self.inference.close()
+            self.spider.downloaded_hashes.close()
         self._print_summary()
 
     def _process_url(self, url):
@@ -887,7 +1378,7 @@ class ClothingScraperPipeline:
                 
             # 3. Classify and validate clothing category
             logger.info("Classifying clothing type...")
-            clothing_type, category, confidence = self.classifier.classify(temp_path)
+            clothing_type, category, confidence = self.inference.classify(temp_path)
             
             if clothing_type == "REJECTED":
                 with self.spider.lock:
@@ -940,9 +1431,7 @@ class ClothingScraperPipeline:
                 self.stats['items_added'] += 1
                 
             img_hash = self.spider._get_image_hash(image_url)
-            self.spider._save_downloaded_hash(img_hash)
-            with self.spider.lock:
-                self.spider.downloaded_hashes.add(img_hash)
+            self.spider.downloaded_hashes.add(img_hash)
                 
             logger.info("APPROVED and saved as: %s", final_filename)
             
@@ -988,6 +1477,8 @@ class ClothingScraperPipeline:
         logger.info("Rejected - invalid category: %d", self.stats['invalid_category'])
         logger.info("APPROVED product images: %d", self.stats['images_saved'])
         logger.info("Items added to catalog: %d", self.stats['items_added'])
+        logger.info("Inference: %d batches, %.1f images/batch, %.1f images/sec",
+                    self.inference.batches, self.inference.mean_batch_size(), self.classifier.images_per_second())
         logger.info("Images folder: %s", OUTPUT_DIR)
         logger.info("CSV: %s", CSV_PATH)
 